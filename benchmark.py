@@ -0,0 +1,262 @@
+"""
+Benchmarks for the regex preprocessing, pretokenization, merging, training
+and tokenization code on the bundled datasets.
+
+    python benchmark.py run --out output/benchmarks.json
+    python benchmark.py compare baseline.json output/benchmarks.json
+"""
+import argparse
+import functools
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+from part1_regex import preprocess_part1
+from part2_tokenization import BPETokenizer, SentencePieceBPE, gpt2_pretokenize, merge_pair
+from part3_analysis import load_sentiment140, load_wikipedia
+
+DEFAULT_OUT = "output/benchmarks.json"
+DEFAULT_THRESHOLD = 0.10
+
+
+def percentile(samples, q):
+    """
+    Nearest-rank percentile of a list of samples.
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def measure(fn, setup=None, repeats=5, warmup=1, nbytes=0):
+    """
+    Time fn() over `repeats` runs after `warmup` untimed ones.
+
+    fn returns how many units (tokens, texts, ...) it produced. `setup`, if
+    given, runs untimed before every call. Peak memory comes from one more
+    run under tracemalloc, kept apart because tracing slows everything down.
+    """
+    for _ in range(warmup):
+        if setup is not None:
+            setup()
+        fn()
+
+    samples = []
+    units = 0
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter_ns()
+        units = fn()
+        samples.append(time.perf_counter_ns() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(samples)
+    seconds = median / 1e9
+    return {
+        "repeats": repeats,
+        "warmup": warmup,
+        "samples_ns": samples,
+        "min_ns": min(samples),
+        "median_ns": median,
+        "p95_ns": percentile(samples, 95),
+        "stdev_ns": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "units": units,
+        "units_per_s": units / seconds if seconds else 0.0,
+        "bytes": nbytes,
+        "bytes_per_s": nbytes / seconds if seconds else 0.0,
+        "peak_memory_bytes": peak,
+    }
+
+
+def text_bytes(texts):
+    return sum(len(text.encode("utf-8")) for text in texts)
+
+
+def benchmarks(sent, wiki):
+    """
+    name -> factory for every benchmark. A factory returns (fn, setup, input
+    bytes); the trained models and word lists they need are only built the
+    first time a selected benchmark asks for them.
+    """
+    sp_texts = sent[:500]
+
+    @functools.cache
+    def bpe():
+        tokenizer = BPETokenizer(num_merges=1000)
+        tokenizer.train(sent)
+        return tokenizer
+
+    @functools.cache
+    def sp():
+        tokenizer = SentencePieceBPE(num_merges=300)
+        tokenizer.train(sent[:2000])
+        return tokenizer
+
+    @functools.cache
+    def sp_trie():
+        tokenizer = SentencePieceBPE(num_merges=300, encoder="trie")
+        tokenizer.load_merges(sp().merge_ids, sp().vocab.values())
+        return tokenizer
+
+    @functools.cache
+    def word_splits():
+        words = {word for text in wiki for word in gpt2_pretokenize(text)}
+        return [list(word.encode("utf-8")) for word in words]
+
+    def count_tokens(fn, texts):
+        return sum(len(fn(text)) for text in texts)
+
+    def merge_all():
+        splits = word_splits()
+        pair = Counter(p for split in splits for p in zip(split, split[1:])).most_common(1)[0][0]
+        def run():
+            for split in splits:
+                merge_pair(split, pair, 256)
+            return len(splits)
+        return run, None, sum(len(split) for split in splits)
+
+    def train(tokenizer_cls, texts, **params):
+        def run():
+            tokenizer = tokenizer_cls(**params)
+            tokenizer.train(texts)
+            return len(tokenizer.merges)
+        return lambda: (run, None, text_bytes(texts))
+
+    def tokenize(tokenizer, texts, clear_cache=False):
+        def factory():
+            model = tokenizer()
+            setup = model.cache.clear if clear_cache else None
+            return lambda: count_tokens(model.tokenize, texts), setup, text_bytes(texts)
+        return factory
+
+    return {
+        "preprocess_part1/sentiment140": lambda: (
+            lambda: len([preprocess_part1(text) for text in sent]), None, text_bytes(sent)),
+        "gpt2_pretokenize/sentiment140": lambda: (
+            lambda: count_tokens(gpt2_pretokenize, sent), None, text_bytes(sent)),
+        "gpt2_pretokenize/wikipedia": lambda: (
+            lambda: count_tokens(gpt2_pretokenize, wiki), None, text_bytes(wiki)),
+        "merge_pair/wikipedia_words": merge_all,
+        "train/bpe_1000/sentiment140": train(BPETokenizer, sent, num_merges=1000),
+        "train/sp_300/sentiment140_2000": train(SentencePieceBPE, sent[:2000], num_merges=300),
+        "tokenize/bpe_1000/sentiment140": tokenize(bpe, sent, clear_cache=True),
+        "tokenize/sp_300_merges/sentiment140_500": tokenize(sp, sp_texts),
+        "tokenize/sp_300_trie/sentiment140_500": tokenize(sp_trie, sp_texts),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    print("Loading datasets...")
+    sent = load_sentiment140()
+    wiki = load_wikipedia()
+    suite = benchmarks(sent, wiki)
+
+    results = {}
+    for name, factory in suite.items():
+        if args.only and not any(part in name for part in args.only):
+            continue
+        fn, setup, nbytes = factory()
+        result = measure(fn, setup, repeats=args.repeats, warmup=args.warmup, nbytes=nbytes)
+        results[name] = result
+        print(
+            f"  {name:45s} median {result['median_ns'] / 1e6:10.2f}ms"
+            f"  p95 {result['p95_ns'] / 1e6:10.2f}ms"
+            f"  {result['bytes_per_s'] / 1e6:8.2f} MB/s"
+            f"  peak {result['peak_memory_bytes'] / 1e6:8.2f} MB"
+        )
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "benchmarks": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.out}")
+
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result files' benchmarks. Returns rows of (name, baseline
+    median ns, current median ns, ratio, regressed); a benchmark regressed
+    when its median time grew by more than `threshold`.
+    """
+    rows = []
+    for name, base in baseline["benchmarks"].items():
+        cur = current["benchmarks"].get(name)
+        if cur is None:
+            continue
+        ratio = cur["median_ns"] / base["median_ns"] if base["median_ns"] else math.inf
+        rows.append((name, base["median_ns"], cur["median_ns"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    for name, base, cur, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"  {name:45s} {base / 1e6:10.2f}ms -> {cur / 1e6:10.2f}ms  x{ratio:5.2f}  {flag}")
+    regressions = [row for row in rows if row[4]]
+    print(f"{len(regressions)} regression(s) over {args.threshold:.0%} in {len(rows)} benchmarks")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save JSON results")
+    run_parser.add_argument("--out", default=DEFAULT_OUT)
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--only", nargs="*", help="run benchmarks whose name contains any of these")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="allowed slowdown of the median, as a fraction")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
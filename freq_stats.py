@@ -0,0 +1,68 @@
+import heapq
+from collections import Counter
+from itertools import compress, islice
+from operator import itemgetter
+
+_count = itemgetter(1)
+
+
+def _cutoff(histogram, k):
+    """
+    From a value -> number of items histogram, the k-th smallest value and
+    how many items are smaller than it.
+    """
+    smaller = 0
+    for value in sorted(histogram):
+        if smaller + histogram[value] >= k:
+            return value, smaller
+        smaller += histogram[value]
+    return value, smaller - histogram[value]
+
+
+def top_k(freqs, k):
+    """
+    The k most frequent (token, count) pairs, the same as freqs.most_common(k).
+    """
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, freqs.items(), key=_count)
+
+
+def bottom_k(freqs, k):
+    """
+    The k least frequent (token, count) pairs, the same as
+    freqs.most_common()[-k:]: listed by descending count, ties in insertion
+    order.
+    """
+    if k <= 0 or not freqs:
+        return []
+    # The count of the k-th least frequent token, and how many are rarer
+    cutoff, smaller = _cutoff(Counter(freqs.values()), k)
+    below = compress(freqs.items(), map(cutoff.__gt__, freqs.values()))
+    # Tokens tied at the cutoff are taken from the end of the insertion order
+    ties = compress(reversed(freqs.items()), map(cutoff.__eq__, reversed(freqs.values())))
+    ties = list(islice(ties, k - smaller))
+    ties.reverse()
+    return ties + sorted(below, key=_count, reverse=True)
+
+
+def longest_k(tokens, k):
+    """
+    The k longest tokens, the same as sorted(tokens, key=len, reverse=True)[:k].
+    """
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, tokens, key=len)
+
+
+def summarize(freqs, k=100):
+    """
+    Top-k, bottom-k and longest-k of a token -> count mapping, as the
+    reports list them. None of them sorts the whole vocabulary, and ties
+    come out exactly as in most_common() and a stable sort by length.
+    """
+    return {
+        "top": top_k(freqs, k),
+        "bottom": bottom_k(freqs, k),
+        "longest": longest_k(freqs, k),
+    }
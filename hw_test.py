@@ -1,16 +1,33 @@
+import io
+import json
+import os
+import tempfile
+from collections import Counter
+
 from part1_regex import (
     replace_mentions,
     replace_urls,
     replace_hashtags,
     preprocess_part1,
+    preprocess_batch,
+    prefilter_stats,
+    reset_prefilter_stats,
+    align_offsets,
     MENTION_TOKEN,
     URL_TOKEN,
     HASHTAG_TOKEN,
 )
+from freq_stats import bottom_k, longest_k, summarize, top_k
 from part2_tokenization import (
     BPETokenizer,
     SentencePieceBPE,
+    TokenizerMetrics,
+    gpt2_pretokenize,
+    merge_pair,
+    merge_in_place,
 )
+from part3_analysis import Ref, TrainingCache, analysis_nodes, run_dag
+from benchmark import compare_results, percentile
 
 
 def check(name, got, expected):
@@ -333,6 +350,60 @@ def main():
         f"link {URL_TOKEN} {HASHTAG_TOKEN} end",
     )
 
+    # Single-pass engine matches replacing urls, mentions, then hashtags
+    tricky = [
+        "@foo www.site.com more words",
+        "@foo bar http://x.com baz",
+        "@foowww.x.com and #tagwww.y.com",
+        "#foo@bar @bar#foo",
+        "@a b c HTTP://X.COM d",
+        "mail a@b.com or #1 @ # http:// www.",
+    ]
+
+    for text in tricky:
+        total += 1
+        passed += check(
+            f"single pass matches sequential {text!r}",
+            preprocess_part1(text),
+            replace_hashtags(replace_mentions(replace_urls(text))),
+        )
+
+    total += 1
+    passed += check(
+        "preprocess batch",
+        preprocess_batch(tricky),
+        [preprocess_part1(text) for text in tricky],
+    )
+
+    # Prefilter: plain texts skip the regex and are counted as fast
+    reset_prefilter_stats()
+    preprocess_batch(["just a plain sentence", "hi @bob", "see WWW.x.com", ""])
+
+    total += 1
+    passed += check(
+        "prefilter counts fast and full paths",
+        prefilter_stats,
+        {"fast": 2, "full": 2},
+    )
+
+    # Span map of replacements, in new and original text offsets
+    total += 1
+    passed += check(
+        "preprocess returns replacement spans",
+        preprocess_part1("hi @bob see www.x.com #tag", return_spans=True),
+        (
+            f"hi {MENTION_TOKEN} see {URL_TOKEN} {HASHTAG_TOKEN}",
+            [(3, 12, 3, 7), (17, 22, 12, 21), (23, 32, 22, 26)],
+        ),
+    )
+
+    total += 1
+    passed += check(
+        "preprocess spans for clean text",
+        preprocess_part1("nothing here", return_spans=True),
+        ("nothing here", []),
+    )
+
     print(f"\nSummary: {passed}/{total} tests passed.")
 
 
@@ -396,7 +467,7 @@ def part2_tests():
     total += 1
     passed += check(
         "bpe vocab keys [HAND-TRACED]",
-        set(bpe.vocab.keys()),
+        {bpe.byte_vocab.id_to_str[i] for i in bpe.vocab.values()},
         {" ", " aa", "aa", "b"},
     )
 
@@ -454,6 +525,206 @@ def part2_tests():
             text,
         )
 
+    # BPE rank-based encoding matches applying every merge in order
+    text = "the cat sat on the mat at the cathedral"
+    sequential = []
+    for word in gpt2_pretokenize(text):
+        split = list(word)
+        for merge in bpe_recon.merges:
+            split = merge_pair(split, merge)
+        sequential.extend(split)
+
+    total += 1
+    passed += check(
+        "bpe rank encoder matches sequential merges",
+        bpe_recon.tokenize(text),
+        sequential,
+    )
+
+    # In-place merging matches merge_pair and keeps pair counts up to date
+    in_place_results = []
+    in_place_expected = []
+    for word, pair in (("aaaaa", ("a", "a")), ("abcabab", ("a", "b")), ("xaax", ("a", "x")), ("abc", ("c", "a"))):
+        split = list(word)
+        counts = dict(Counter(zip(split, split[1:])))
+        merge_in_place(split, pair, pair[0] + pair[1], counts)
+        in_place_results.append((split, counts))
+        expected_split = merge_pair(list(word), pair)
+        in_place_expected.append((expected_split, dict(Counter(zip(expected_split, expected_split[1:])))))
+
+    total += 1
+    passed += check("merge_in_place matches merge_pair", in_place_results, in_place_expected)
+
+    # Without a counts table the lost and gained pairs still come from the
+    # merged neighbours, including when the merged symbol was already there
+    change_results = []
+    change_expected = []
+    for word, pair, merged in (("abab", ("a", "b"), "X"), ("aaaa", ("a", "a"), "X"), ("Xab", ("a", "b"), "X")):
+        split = list(word)
+        removed, added = merge_in_place(split, pair, merged, changes=True)
+        change_results.append((sorted(removed), sorted(added)))
+        old_pairs = set(zip(word, word[1:]))
+        new_pairs = set(zip(split, split[1:]))
+        change_expected.append((sorted(old_pairs - new_pairs), sorted(new_pairs - old_pairs)))
+
+    total += 1
+    passed += check("merge_in_place reports changed pairs", change_results, change_expected)
+
+    # Streaming tokenization gives the same tokens for any block size, even
+    # when a pretoken like "'re" is cut by a block boundary
+    stream_text = "we're at the cat's mat  \n the cathedral  "
+    stream_ok = all(
+        list(bpe_recon.iter_tokens(io.StringIO(stream_text), block_size=size))
+        == bpe_recon.tokenize(stream_text)
+        for size in (1, 2, 3, 4, 7)
+    )
+
+    total += 1
+    passed += check("bpe iter_tokens matches tokenize across blocks", stream_ok, True)
+
+    offsets = list(bpe_recon.iter_tokens(io.StringIO(stream_text), with_offsets=True, block_size=3))
+
+    total += 1
+    passed += check(
+        "bpe iter_tokens offsets slice the text into tokens",
+        ([i for i, _, _ in offsets], [stream_text[s:e] for _, s, e in offsets]),
+        (bpe_recon.encode(stream_text), bpe_recon.tokenize(stream_text)),
+    )
+
+    # Offsets over preprocessed text map back to the original text; tokens
+    # inside a replacement cover the whole replaced text
+    raw_text = "the cat @bob sat"
+    clean_text, clean_spans = preprocess_part1(raw_text, return_spans=True)
+    aligned = align_offsets(bpe_recon.encode(clean_text, return_offsets=True), clean_spans)
+
+    aligned_text = [raw_text[s:e] for _, s, e in aligned]
+
+    total += 1
+    passed += check(
+        "bpe offsets align to original text",
+        (aligned_text[:2], set(aligned_text[3:-1]), aligned_text[-1]),
+        (["the", " cat"], {"@bob"}, " sat"),
+    )
+
+    # BPE word cache: repeated words are served from the cache, the cache
+    # is bounded, and retraining empties it
+    bpe_cache = BPETokenizer(num_merges=2, cache_size=2)
+    bpe_cache.train(["aa aa aa bb"])
+    bpe_cache.tokenize("aa aa")
+    cached_tokens = bpe_cache.tokenize("aa aa")
+
+    total += 1
+    passed += check(
+        "bpe cache hits and misses",
+        (cached_tokens, bpe_cache.cache.hits, bpe_cache.cache.misses),
+        (["aa", " aa"], 2, 2),
+    )
+
+    bpe_cache.tokenize("bb cc")
+    total += 1
+    passed += check("bpe cache respects size limit", len(bpe_cache.cache), 2)
+
+    bpe_cache.train(["aa aa aa bb"])
+    total += 1
+    passed += check("bpe cache cleared on retrain", len(bpe_cache.cache), 0)
+
+    # Batch encoding returns the same tokens in input order
+    batch_texts = ["the cat", "the mat sat", "on", "", "the cat sat on the mat"]
+
+    total += 1
+    passed += check(
+        "bpe encode_batch single process",
+        bpe_recon.encode_batch(batch_texts),
+        [bpe_recon.encode(t) for t in batch_texts],
+    )
+
+    total += 1
+    passed += check(
+        "bpe encode_batch worker processes",
+        bpe_recon.encode_batch(batch_texts, workers=2),
+        [bpe_recon.encode(t) for t in batch_texts],
+    )
+
+    total += 1
+    passed += check(
+        "bpe tokenize_batch worker processes",
+        bpe_recon.tokenize_batch(batch_texts, workers=2),
+        [bpe_recon.tokenize(t) for t in batch_texts],
+    )
+
+    # Token counts without token lists, merged across worker counters
+    batch_counts = Counter(tok for text in batch_texts for tok in bpe_recon.tokenize(text))
+
+    total += 1
+    passed += check(
+        "bpe count_tokens single and worker processes",
+        (bpe_recon.count_tokens(iter(batch_texts)), bpe_recon.count_tokens(batch_texts, workers=2)),
+        (batch_counts, batch_counts),
+    )
+
+    # Byte-level ids: distinct non-ASCII bytes stay distinct, and decode
+    # gives back the exact input text
+    bpe_bytes = BPETokenizer(num_merges=2)
+    bpe_bytes.train(["é è é"])
+    unicode_text = "naïve café ☕ è"
+
+    total += 1
+    passed += check(
+        "bpe keeps distinct non-ascii bytes apart",
+        "é" in bpe_bytes.tokenize("é") and "è" not in bpe_bytes.tokenize("è"),
+        True,
+    )
+
+    total += 1
+    passed += check(
+        "bpe decode is lossless",
+        bpe_bytes.decode(bpe_bytes.encode(unicode_text)),
+        unicode_text,
+    )
+
+    # Partial-character bytes all display as U+FFFD but are separate tokens
+    # in the vocabulary, also after a save and load
+    bpe_partial = BPETokenizer(num_merges=0)
+    bpe_partial.train(["é ü"])
+    with tempfile.TemporaryDirectory() as tmp:
+        bpe_partial.save(os.path.join(tmp, "partial.bin"))
+        partial_loaded = BPETokenizer.load(os.path.join(tmp, "partial.bin"))
+
+    total += 1
+    passed += check(
+        "bpe vocab keeps byte tokens apart",
+        (sorted(bpe_partial.vocab), partial_loaded.vocab == bpe_partial.vocab),
+        ([b" ", b"\xa9", b"\xbc", b"\xc3"], True),
+    )
+
+    # Streaming training: a generator or a file path gives the same model
+    # as a list of texts
+    stream_lines = ["the cat sat on the mat", "the cat ate", "on the mat"]
+    bpe_list = BPETokenizer(num_merges=10)
+    bpe_list.train(stream_lines)
+    bpe_gen = BPETokenizer(num_merges=10)
+    bpe_gen.train(line for line in stream_lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = os.path.join(tmp, "corpus.txt")
+        with open(corpus_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(stream_lines) + "\n")
+        bpe_file = BPETokenizer(num_merges=10)
+        bpe_file.train_file(corpus_path)
+        sp_list = SentencePieceBPE(num_merges=10)
+        sp_list.train(stream_lines)
+        sp_file = SentencePieceBPE(num_merges=10)
+        sp_file.train_file(corpus_path)
+
+    total += 1
+    passed += check(
+        "bpe train from generator and file",
+        (bpe_gen.merges, bpe_file.merges),
+        (bpe_list.merges, bpe_list.merges),
+    )
+
+    total += 1
+    passed += check("sp train from file", sp_file.merges, sp_list.merges)
+
     # BPE untrained
     bpe_raw = BPETokenizer(num_merges=0)
     bpe_raw.train(["hello"])
@@ -483,6 +754,18 @@ def part2_tests():
         ["ab", " ab"],
     )
 
+    # BPE tie-breaking: ('c','d') and ('a','b') both occur twice, but
+    # ('c','d') comes from the first word in the corpus so it wins the tie.
+    bpe_tie = BPETokenizer(num_merges=1)
+    bpe_tie.train(["cd ab", "ab cd"])
+
+    total += 1
+    passed += check(
+        "bpe tie goes to first word in corpus",
+        bpe_tie.merges,
+        [("c", "d")],
+    )
+
     # BPE empty input
     total += 1
     passed += check(
@@ -528,7 +811,7 @@ def part2_tests():
     total += 1
     passed += check(
         "sp vocab keys [HAND-TRACED]",
-        set(sp.vocab.keys()),
+        {sp.byte_vocab.id_to_str[i] for i in sp.vocab.values()},
         {"aaaa"},
     )
 
@@ -584,6 +867,15 @@ def part2_tests():
         ["ab ab"],
     )
 
+    # After ('a','b') the pairs ('ab',' ') and (' ','ab') tie inside the
+    # same chunk; the leftmost one is merged first.
+    total += 1
+    passed += check(
+        "sp tie goes to leftmost pair",
+        sp_cross.merges[:2],
+        [("a", "b"), ("ab", " ")],
+    )
+
     bpe_no_cross = BPETokenizer(num_merges=5)
     bpe_no_cross.train(["ab ab"])
     bpe_tokens = bpe_no_cross.tokenize("ab ab")
@@ -607,6 +899,47 @@ def part2_tests():
             text,
         )
 
+    total += 1
+    passed += check(
+        "sp encode_batch worker processes",
+        sp_recon.encode_batch(["the cat", "sat on", "mat"], workers=2),
+        [sp_recon.encode(t) for t in ["the cat", "sat on", "mat"]],
+    )
+
+    # Frequency-aware chunking counts repeated chunks with their real
+    # frequency: ('a','b') comes from three identical lines and beats the
+    # earlier ('c','d')
+    sp_lines = SentencePieceBPE(num_merges=1, chunking="lines")
+    sp_lines.train(["cd", "ab", "ab", "ab"])
+
+    total += 1
+    passed += check("sp line chunks counted by frequency", sp_lines.merges, [("a", "b")])
+
+    sp_ws = SentencePieceBPE(num_merges=2, chunking="whitespace")
+    sp_ws.train(["cd ab ab ab"])
+
+    total += 1
+    passed += check(
+        "sp whitespace chunks counted by frequency",
+        sp_ws.merges,
+        [(" ", "a"), (" a", "b")],
+    )
+
+    # The trie encoder gives the same tokens as applying merges in order
+    trie_texts = ["aaa", "aaaa", "the cat sat on the mat", "naïve café", "", "zzz at the"]
+    for corpus in (["aaaa"], ["the cat sat on the mat", "a cat sat"], ["naïve café ca"]):
+        sp_merge = SentencePieceBPE(num_merges=12)
+        sp_merge.train(corpus)
+        sp_trie = SentencePieceBPE(num_merges=12, encoder="trie")
+        sp_trie.train(corpus)
+
+        total += 1
+        passed += check(
+            f"sp trie encoder matches merges {corpus[0]!r}",
+            [sp_trie.tokenize(t) for t in trie_texts],
+            [sp_merge.tokenize(t) for t in trie_texts],
+        )
+
     # SentencePiece untrained
     sp_raw = SentencePieceBPE(num_merges=0)
     sp_raw.train(["hello"])
@@ -626,6 +959,171 @@ def part2_tests():
         [],
     )
 
+    # Saved models load back with the same merges, vocab and encodings
+    model_corpus = ["the cat sat on the mat", "the dog sat", "naïve café"]
+    bpe_model = BPETokenizer(num_merges=15)
+    bpe_model.train(model_corpus)
+    sp_model = SentencePieceBPE(num_merges=15)
+    sp_model.train(model_corpus)
+    with tempfile.TemporaryDirectory() as tmp:
+        bpe_model.save(os.path.join(tmp, "bpe.bin"))
+        sp_model.save(os.path.join(tmp, "sp.bin"))
+        bpe_loaded = BPETokenizer.load(os.path.join(tmp, "bpe.bin"))
+        sp_loaded = SentencePieceBPE.load(os.path.join(tmp, "sp.bin"))
+        sp_model.export_json(os.path.join(tmp, "sp.json"))
+        with open(os.path.join(tmp, "sp.json"), encoding="utf-8") as f:
+            sp_json = json.load(f)
+
+        # Empty files, unknown model kinds and ids past the tokens known so
+        # far are rejected like other bad files
+        with open(os.path.join(tmp, "bpe.bin"), "rb") as f:
+            model_bytes = f.read()
+        bad_kind = bytearray(model_bytes)
+        bad_kind[12:16] = (7).to_bytes(4, "little")
+        # The first merge can only use byte ids
+        bad_merge = bytearray(model_bytes)
+        bad_merge[28:32] = (256).to_bytes(4, "little")
+        bad_vocab = bytearray(model_bytes)
+        bad_vocab[-4:] = (999).to_bytes(4, "little")
+        bad_models = {
+            "empty.bin": b"",
+            "kind.bin": bytes(bad_kind),
+            "merge.bin": bytes(bad_merge),
+            "vocab.bin": bytes(bad_vocab),
+        }
+        bad_model_errors = []
+        for name, data in bad_models.items():
+            with open(os.path.join(tmp, name), "wb") as f:
+                f.write(data)
+            try:
+                BPETokenizer.load(os.path.join(tmp, name))
+                bad_model_errors.append(None)
+            except ValueError:
+                bad_model_errors.append("ValueError")
+
+    for name, model, loaded in (("bpe", bpe_model, bpe_loaded), ("sp", sp_model, sp_loaded)):
+        total += 1
+        passed += check(
+            f"{name} model save/load round trip",
+            (loaded.merges, loaded.vocab, [loaded.encode(t) for t in model_corpus]),
+            (model.merges, model.vocab, [model.encode(t) for t in model_corpus]),
+        )
+
+    total += 1
+    passed += check("model load rejects bad files", bad_model_errors, ["ValueError"] * 4)
+
+    total += 1
+    passed += check(
+        "sp json export",
+        (sp_json["type"], sp_json["merges"], sp_json["vocab"]),
+        ("sentencepiece", [list(p) for p in sp_model.merge_ids], list(sp_model.vocab.values())),
+    )
+
+    # Continuing training, directly or from a checkpoint, learns the same
+    # merges as training with the larger num_merges from the start
+    resume_corpus = ["the cat sat on the mat", "the dog sat on the log", "a cat and a dog"]
+    for cls in (BPETokenizer, SentencePieceBPE):
+        full = cls(num_merges=12)
+        full.train(resume_corpus)
+        grown = cls(num_merges=4)
+        grown.train(resume_corpus, resumable=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            grown.save_checkpoint(os.path.join(tmp, "ckpt.pkl"))
+            resumed = cls.load_checkpoint(os.path.join(tmp, "ckpt.pkl"))
+        grown.continue_training(8)
+        resumed.continue_training(8)
+
+        total += 1
+        passed += check(
+            f"{cls.__name__} continue_training matches full training",
+            (grown.merges, grown.vocab, resumed.merges, resumed.vocab),
+            (full.merges, full.vocab, full.merges, full.vocab),
+        )
+
+        # Training state is only kept when asked for
+        try:
+            full.continue_training(1)
+            resume_error = None
+        except ValueError:
+            resume_error = "ValueError"
+
+        total += 1
+        passed += check(
+            f"{cls.__name__} drops training state unless resumable",
+            (full.trainer is None, grown.trainer is None, resume_error),
+            (True, False, "ValueError"),
+        )
+
+    # A sweep snapshot at k merges matches training with num_merges=k
+    sweep = BPETokenizer().train_sweep(resume_corpus, [8, 3])
+    sweep_expected = []
+    for k in (3, 8):
+        bpe_k = BPETokenizer(num_merges=k)
+        bpe_k.train(resume_corpus)
+        tokens = sum(len(bpe_k.encode(text)) for text in resume_corpus)
+        sweep_expected.append((k, bpe_k.vocab, tokens))
+
+    total += 1
+    passed += check(
+        "bpe sweep snapshots match separate trainings",
+        [(s["num_merges"], s["vocab"], s["tokens"]) for s in sweep],
+        sweep_expected,
+    )
+
+    # Metrics record every merge and encode call without changing results
+    events = []
+    metrics = TokenizerMetrics(callback=lambda event, record: events.append(event))
+    bpe_metrics = BPETokenizer(num_merges=8, metrics=metrics)
+    bpe_metrics.train(resume_corpus)
+    bpe_plain = BPETokenizer(num_merges=8)
+    bpe_plain.train(resume_corpus)
+
+    total += 1
+    passed += check(
+        "bpe metrics record each merge",
+        (
+            bpe_metrics.merge_ids,
+            [r["merge"] for r in metrics.merge_records],
+            [r["pair"] for r in metrics.merge_records],
+            all(r["words_touched"] > 0 and r["frequency"] > 0 for r in metrics.merge_records),
+        ),
+        (bpe_plain.merge_ids, list(range(8)), bpe_plain.merge_ids, True),
+    )
+
+    bpe_metrics.encode("ab ab ab")
+    summary = metrics.summary()
+
+    total += 1
+    passed += check(
+        "bpe metrics encode totals and callback",
+        (
+            bpe_metrics.encode("ab ab ab"),
+            summary["encode_bytes"],
+            summary["encode_words"],
+            summary["cache_hits"],
+            summary["cache_misses"],
+            events,
+        ),
+        (bpe_plain.encode("ab ab ab"), 8, 3, 1, 2, ["merge"] * 8 + ["encode", "encode"]),
+    )
+
+    # Retraining starts the merge records over; continuing adds to them
+    rerun_indexes = []
+    for cls in (BPETokenizer, SentencePieceBPE):
+        rerun_metrics = TokenizerMetrics()
+        rerun = cls(num_merges=2, metrics=rerun_metrics)
+        rerun.train(resume_corpus, resumable=True)
+        rerun.train(resume_corpus, resumable=True)
+        rerun.continue_training(2)
+        rerun_indexes.append([r["merge"] for r in rerun_metrics.merge_records])
+
+    total += 1
+    passed += check(
+        "metrics merge records reset by train, kept by continue_training",
+        rerun_indexes,
+        [[0, 1, 2, 3], [0, 1, 2, 3]],
+    )
+
     # BPE vs SentencePiece comparison
     bpe_cmp = BPETokenizer(num_merges=3)
     bpe_cmp.train(["ab ab"])
@@ -642,6 +1140,198 @@ def part2_tests():
     print(f"\nSummary: {passed}/{total} tests passed.")
 
 
+def freq_stats_tests():
+    print("\nFrequency stats tests\n")
+
+    passed = 0
+    total = 0
+
+    # Ties keep insertion order, as in most_common() and a stable sort
+    freqs = Counter({"bb": 2, "a": 1, "ccc": 3, "d": 1, "ee": 2, "f": 1, "gggg": 1})
+
+    total += 1
+    passed += check("top_k matches most_common(k)", top_k(freqs, 3), freqs.most_common(3))
+
+    for k in (1, 2, 4, 7, 10):
+        total += 1
+        passed += check(
+            f"bottom_k matches most_common()[-{k}:]",
+            bottom_k(freqs, k),
+            freqs.most_common()[-k:],
+        )
+
+    total += 1
+    passed += check(
+        "longest_k matches a stable sort by length",
+        longest_k(freqs, 3),
+        sorted(freqs, key=len, reverse=True)[:3],
+    )
+
+    total += 1
+    passed += check(
+        "summarize of an empty counter",
+        summarize(Counter(), 5),
+        {"top": [], "bottom": [], "longest": []},
+    )
+
+    print(f"\nSummary: {passed}/{total} tests passed.")
+
+
+def part3_tests():
+    print("\nPart 3 tests: analysis step graph\n")
+
+    passed = 0
+    total = 0
+
+    # Refs are resolved inside lists and tuples, and a node listed before
+    # its dependency still runs after it
+    nodes = {
+        "pair": (tuple, (Ref("total"), Ref("a"))),
+        "total": (sum, [Ref("a"), Ref("b")]),
+        "a": (int, "2"),
+        "b": (int, "3"),
+    }
+    expected = {"a": 2, "b": 3, "total": 5, "pair": (5, 2)}
+    in_process = run_dag(nodes, workers=1)
+
+    total += 1
+    passed += check(
+        "run_dag in process results and order",
+        (in_process, list(in_process)),
+        (expected, ["a", "b", "total", "pair"]),
+    )
+
+    total += 1
+    passed += check("run_dag process pool results", run_dag(nodes, workers=2), expected)
+
+    bad_graphs = [
+        ({"a": (len, Ref("missing"))}, 1),
+        ({"a": (len, Ref("b")), "b": (len, Ref("a"))}, 1),
+        ({"a": (len, Ref("b")), "b": (len, Ref("a"))}, 2),
+    ]
+    errors = []
+    for graph, workers in bad_graphs:
+        try:
+            run_dag(graph, workers=workers)
+            errors.append(None)
+        except ValueError:
+            errors.append("ValueError")
+
+    total += 1
+    passed += check(
+        "run_dag rejects unknown nodes and cycles",
+        errors,
+        ["ValueError"] * 3,
+    )
+
+    # Training cache keys depend on the class, settings and corpus
+    cache_texts = ["the cat sat", "on the mat"]
+    key = TrainingCache.key(BPETokenizer, cache_texts, num_merges=5)
+
+    total += 1
+    passed += check(
+        "training cache key changes with class, params and corpus",
+        (
+            TrainingCache.key(BPETokenizer, cache_texts, num_merges=5) == key,
+            TrainingCache.key(SentencePieceBPE, cache_texts, num_merges=5) == key,
+            TrainingCache.key(BPETokenizer, cache_texts, num_merges=6) == key,
+            TrainingCache.key(BPETokenizer, ["the cat sat"], num_merges=5) == key,
+        ),
+        (True, False, False, False),
+    )
+
+    # The in-memory LRU drops the least recently used model past maxsize
+    lru = TrainingCache(maxsize=2)
+    for texts in (["aa"], ["bb"], ["cc"], ["cc"], ["aa"]):
+        lru.get_or_train(BPETokenizer, texts, num_merges=1)
+
+    total += 1
+    passed += check("training cache LRU evicts past maxsize", (lru.hits, lru.misses), (1, 4))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A later run loads the model from disk with its original train time
+        first, train_time = TrainingCache(cache_dir=tmp).get_or_train(
+            BPETokenizer, cache_texts, num_merges=5
+        )
+        reloaded = TrainingCache(cache_dir=tmp)
+        loaded, loaded_time = reloaded.get_or_train(BPETokenizer, cache_texts, num_merges=5)
+
+        total += 1
+        passed += check(
+            "training cache disk round trip",
+            (loaded.merges, loaded_time, reloaded.hits, reloaded.misses),
+            (first.merges, train_time, 1, 0),
+        )
+
+        # The disk cache drops the least recently used models past disk_maxsize
+        disk = TrainingCache(cache_dir=tmp, disk_maxsize=2)
+        for name in os.listdir(tmp):
+            os.remove(os.path.join(tmp, name))
+        for i, name in enumerate(("old", "mid", "new")):
+            disk._store(name, first, float(i))
+            os.utime(os.path.join(tmp, name + ".bin"), (i + 1, i + 1))
+
+        total += 1
+        passed += check(
+            "training cache evicts down to disk_maxsize",
+            sorted(os.listdir(tmp)),
+            ["mid.bin", "mid.json", "new.bin", "new.json"],
+        )
+
+    nodes, order = analysis_nodes()
+
+    total += 1
+    passed += check(
+        "analysis reports are all nodes",
+        all(name in nodes for name in order),
+        True,
+    )
+
+    print(f"\nSummary: {passed}/{total} tests passed.")
+
+
+def benchmark_tests():
+    print("\nBenchmark tests\n")
+
+    passed = 0
+    total = 0
+
+    samples = [50, 10, 40, 20, 30]
+
+    total += 1
+    passed += check(
+        "percentile nearest rank",
+        (percentile(samples, 50), percentile(samples, 95), percentile(samples, 0), percentile([7], 95)),
+        (30, 50, 10, 7),
+    )
+
+    # Only medians that grew by more than the threshold are regressions;
+    # benchmarks missing from the current run are skipped
+    baseline = {"benchmarks": {
+        "fast": {"median_ns": 100}, "slow": {"median_ns": 100}, "gone": {"median_ns": 5},
+    }}
+    current = {"benchmarks": {"fast": {"median_ns": 105}, "slow": {"median_ns": 120}}}
+
+    total += 1
+    passed += check(
+        "compare_results flags regressions over the threshold",
+        [(name, regressed) for name, _, _, _, regressed in compare_results(baseline, current, 0.10)],
+        [("fast", False), ("slow", True)],
+    )
+
+    total += 1
+    passed += check(
+        "compare_results threshold is a fraction of the baseline",
+        [regressed for *_, regressed in compare_results(baseline, current, 0.25)],
+        [False, False],
+    )
+
+    print(f"\nSummary: {passed}/{total} tests passed.")
+
+
 if __name__ == "__main__":
     main()
     part2_tests()
+    freq_stats_tests()
+    part3_tests()
+    benchmark_tests()
@@ -1,5 +1,16 @@
+import copy
+import heapq
+import itertools
+import json
+import math
+import pickle
+import struct
+import sys
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import regex as re
-from collections import Counter, defaultdict
 
 
 def space_tokenize(text):
@@ -26,6 +37,124 @@ def gpt2_pretokenize(text):
     return GPT2_PATTERN.findall(text)
 
 
+# Longest match the pattern can make from lookahead alone ('re, 've, 'll),
+# so matches starting closer than this to the end of a block may change
+GPT2_MAX_LOOKAHEAD = 3
+
+
+def iter_pretokens(text_or_file, block_size=1 << 16):
+    """
+    Yield (pretoken, start) pairs for a string or a file-like object, where
+    start is the character offset of the pretoken.
+
+    Files are read in blocks of `block_size` characters. Matches at the end
+    of a block are held back until the next block arrives, since they may
+    continue into it, so the pretokens are the same as for the whole text.
+    """
+    if isinstance(text_or_file, str):
+        for match in GPT2_PATTERN.finditer(text_or_file):
+            yield match.group(), match.start()
+        return
+
+    buffer = ""
+    base = 0
+    while True:
+        block = text_or_file.read(block_size)
+        buffer += block
+        if not block:
+            for match in GPT2_PATTERN.finditer(buffer):
+                yield match.group(), base + match.start()
+            return
+
+        done = 0
+        limit = len(buffer) - GPT2_MAX_LOOKAHEAD
+        for match in GPT2_PATTERN.finditer(buffer):
+            if match.end() == len(buffer) or match.start() >= limit:
+                break
+            yield match.group(), base + match.start()
+            done = match.end()
+        buffer = buffer[done:]
+        base += done
+
+
+def token_spans(word, tokens, id_to_bytes, start=0):
+    """
+    (start, end) character offsets of each token of a word beginning at
+    `start`. A token holding only part of a multi-byte character is given
+    the whole character.
+    """
+    spans = []
+    if word.isascii():
+        for token in tokens:
+            end = start + len(id_to_bytes[token])
+            spans.append((start, end))
+            start = end
+        return spans
+
+    # Character index of every byte of the word
+    char_of = []
+    for i, char in enumerate(word):
+        char_of.extend([i] * len(char.encode("utf-8")))
+    pos = 0
+    for token in tokens:
+        end = pos + len(id_to_bytes[token])
+        spans.append((start + char_of[pos], start + char_of[end - 1] + 1))
+        pos = end
+    return spans
+
+
+def read_lines(path):
+    """
+    Yield the lines of a text file without their line endings.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def iter_chunks(corpus, chunk_size):
+    """
+    Yield the same fixed-size chunks as slicing " ".join(corpus), without
+    building the joined string.
+    """
+    buffer = ""
+    for i, text in enumerate(corpus):
+        buffer = buffer + text if i == 0 else buffer + " " + text
+        start = 0
+        while len(buffer) - start >= chunk_size:
+            yield buffer[start : start + chunk_size]
+            start += chunk_size
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def iter_line_chunks(corpus, chunk_size):
+    """
+    Yield chunk_size windows of each text separately, so no chunk spans two
+    lines and repeated lines give repeated chunks.
+    """
+    for text in corpus:
+        for start in range(0, len(text), chunk_size):
+            yield text[start : start + chunk_size]
+
+
+# A run of whitespace together with the non-space text that follows it
+WHITESPACE_CHUNK_PATTERN = re.compile(r"\s*\S+|\s+")
+
+
+def iter_whitespace_chunks(corpus):
+    """
+    Yield the pieces of each text split in front of every whitespace run.
+    """
+    for text in corpus:
+        yield from WHITESPACE_CHUNK_PATTERN.findall(text)
+
+
+CHUNKING_MODES = ("fixed", "lines", "whitespace")
+SP_ENCODERS = ("merges", "trie")
+
+
 def get_byte_pairs(word):
     """
     Get all adjacent byte pairs in a word.
@@ -36,15 +165,20 @@ def get_byte_pairs(word):
     return pairs
 
 
-def merge_pair(word, pair):
+def merge_pair(word, pair, merged=None):
     """
     Merge a specific pair in a word.
+
+    `merged` is the symbol that replaces the pair, by default the two symbols
+    concatenated.
     """
+    if merged is None:
+        merged = pair[0] + pair[1]
     new_word = []
     i = 0
     while i < len(word):
         if i < len(word) - 1 and word[i] == pair[0] and word[i + 1] == pair[1]:
-            new_word.append(pair[0] + pair[1])
+            new_word.append(merged)
             i += 2
         else:
             new_word.append(word[i])
@@ -52,151 +186,1318 @@ def merge_pair(word, pair):
     return new_word
 
 
-class BPETokenizer:
+def merge_in_place(split, pair, merged, counts=None, changes=False):
+    """
+    Merge every occurrence of a pair in a list, left to right like
+    merge_pair, without building a new list.
+
+    With `changes` set, the pairs that disappeared from or newly appeared
+    in the list are returned, worked out from the neighbours of each merged
+    position. `counts`, a pair -> occurrence count table for the list, is
+    updated along the way when given; without it the merged list's pairs
+    are collected once to see which of the touched pairs are left.
+    """
+    left, right = pair
+    track = changes or counts is not None
+    # Pairs holding `merged` can only be new if it was not in the list yet
+    fresh = track and counts is None and merged not in split
+    # Change in occurrence count of each touched pair
+    deltas = {}
+    get = deltas.get
+    j = -1
+    # Counting first ends the search without an exception from index()
+    remaining = split.count(left)
+    while remaining:
+        j = split.index(left, j + 1)
+        remaining -= 1
+        if j + 1 < len(split) and split[j + 1] == right:
+            if left == right:
+                remaining -= 1
+            if track:
+                deltas[pair] = get(pair, 0) - 1
+                if j > 0:
+                    prev = split[j - 1]
+                    p = (prev, left)
+                    deltas[p] = get(p, 0) - 1
+                    p = (prev, merged)
+                    deltas[p] = get(p, 0) + 1
+                if j + 2 < len(split):
+                    nxt = split[j + 2]
+                    p = (right, nxt)
+                    deltas[p] = get(p, 0) - 1
+                    p = (merged, nxt)
+                    deltas[p] = get(p, 0) + 1
+            split[j] = merged
+            del split[j + 1]
+
+    if not track:
+        return None
+    if fresh:
+        left_over = set(zip(split, split[1:]))
+        removed = []
+        added = []
+        for p, delta in deltas.items():
+            if delta > 0:
+                added.append(p)
+            elif delta and p not in left_over:
+                removed.append(p)
+        return removed, added
+
+    if counts is None:
+        after = Counter(zip(split, split[1:]))
+    else:
+        after = {}
+        for p, delta in deltas.items():
+            count = after[p] = counts.get(p, 0) + delta
+            if count:
+                counts[p] = count
+            else:
+                counts.pop(p, None)
+    # A pair went away when its count fell to 0, and is new when all of its
+    # occurrences came from this merge
+    removed = [p for p, delta in deltas.items() if delta < 0 and not after[p]]
+    added = [p for p, delta in deltas.items() if delta > 0 and after[p] == delta]
+    return removed, added
+
+
+def merge_ranks(merges):
+    """
+    Map each learned merge to its rank (position in the merge list).
+    """
+    ranks = {}
+    for rank, pair in enumerate(merges):
+        ranks.setdefault(pair, rank)
+    return ranks
+
+
+def merge_by_rank(word, ranks, merge_table=None):
+    """
+    Apply learned merges to a word by repeatedly merging the adjacent pair
+    with the lowest rank, GPT-2 style.
+
+    Gives the same result as running merge_pair for every merge in order, but
+    only pairs that are actually present are looked at. The word is kept as a
+    linked list and candidate pairs in a heap keyed by (rank, position), so
+    equal-rank pairs are still merged left to right. `merge_table` maps a pair
+    to its merged symbol; without it the two symbols are concatenated.
+    """
+    n = len(word)
+    if n < 2:
+        return list(word)
+
+    symbols = list(word)
+    nxt = list(range(1, n + 1))
+    prv = list(range(-1, n - 1))
+    heap = []
+    for i in range(n - 1):
+        rank = ranks.get((symbols[i], symbols[i + 1]))
+        if rank is not None:
+            heap.append((rank, i))
+    heapq.heapify(heap)
+
+    while heap:
+        rank, i = heapq.heappop(heap)
+        j = nxt[i]
+        # Skip entries whose pair has since been merged away
+        if symbols[i] is None or j >= n or ranks.get((symbols[i], symbols[j])) != rank:
+            continue
+
+        if merge_table is None:
+            symbols[i] = symbols[i] + symbols[j]
+        else:
+            symbols[i] = merge_table[symbols[i], symbols[j]]
+        symbols[j] = None
+        nxt[i] = nxt[j]
+        if nxt[j] < n:
+            prv[nxt[j]] = i
+
+        p = prv[i]
+        if p >= 0:
+            left = ranks.get((symbols[p], symbols[i]))
+            if left is not None:
+                heapq.heappush(heap, (left, p))
+        k = nxt[i]
+        if k < n:
+            right = ranks.get((symbols[i], symbols[k]))
+            if right is not None:
+                heapq.heappush(heap, (right, i))
+
+    return [s for s in symbols if s is not None]
+
+
+def count_pairs(splits, freqs):
+    """
+    Count adjacent pairs over a list of word splits.
+
+    Returns a pair -> frequency table (each pair counted once per word,
+    weighted by the word frequency) and a pair -> word index table.
+    """
+    pair_freqs = defaultdict(int)
+    pair_words = defaultdict(set)
+    for i, split in enumerate(splits):
+        freq = freqs[i]
+        for pair in get_byte_pairs(split):
+            pair_freqs[pair] += freq
+            pair_words[pair].add(i)
+    return pair_freqs, pair_words
+
+
+# Words longer than this are merged using per-word pair counts
+COUNTED_WORD_LENGTH = 16
+
+
+class MergeTrainer:
+    """
+    Incremental BPE training engine.
+
+    Keeps a live pair -> frequency table and a pair -> word inverted index so
+    that each merge only revisits the words that contain the merged pair.
+    Like the original recount loop, a pair is counted once per word, weighted
+    by the word frequency.
+
+    The next merge is picked from a heap of (-frequency, first word, pair)
+    entries. Entries are never removed when a pair changes; a fresh one is
+    pushed instead and stale ones are skipped when they reach the top.
+
+    Words are merged in place, and the pairs a word lost or gained are
+    worked out from the neighbours of the merged positions rather than by
+    comparing its pair sets before and after. Long words also keep a count
+    of how often each pair occurs in them, so the rest of the word is never
+    rescanned.
+    """
+
+    def __init__(self, splits, freqs):
+        self.splits = splits
+        self.freqs = freqs
+        self.pair_freqs, self.pair_words = count_pairs(splits, freqs)
+
+        # Long words keep per-pair occurrence counts so a merge only looks at
+        # the merged positions; short ones are cheaper to rescan. Pair tuples
+        # are shared with pair_freqs to keep the tables small.
+        keys = {pair: pair for pair in self.pair_freqs}
+        self.word_pairs = [
+            dict(Counter(keys[pair] for pair in zip(split, split[1:])))
+            if len(split) > COUNTED_WORD_LENGTH else None
+            for split in splits
+        ]
+
+        # Words are indexed in corpus order, so a pair's first word is its lowest index
+        self.first_word = {pair: min(words) for pair, words in self.pair_words.items()}
+        self.heap = [
+            (-freq, self.first_word[pair], pair)
+            for pair, freq in self.pair_freqs.items()
+        ]
+        heapq.heapify(self.heap)
+
+    def _is_current(self, entry):
+        neg_freq, first, pair = entry
+        return (
+            self.pair_freqs.get(pair) == -neg_freq
+            and self.first_word.get(pair) == first
+        )
+
+    def best_pair(self):
+        """
+        Most frequent pair, or None once no pairs are left.
+
+        Ties go to the pair that occurs first in the corpus, which is the pair
+        the recount loop would have inserted first into its table.
+        """
+        heap = self.heap
+        while heap and not self._is_current(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+
+        # Pairs tied on frequency and first word are told apart by position
+        top = heapq.heappop(heap)
+        tied = {top[2]: top}
+        while heap and heap[0][:2] == top[:2]:
+            entry = heapq.heappop(heap)
+            if self._is_current(entry):
+                tied[entry[2]] = entry
+        if len(tied) == 1:
+            heapq.heappush(heap, top)
+            return top[2]
+        best = min(tied, key=self.first_occurrence)
+        for entry in tied.values():
+            heapq.heappush(heap, entry)
+        return best
+
+    def first_occurrence(self, pair):
+        """
+        (word index, position) of the leftmost occurrence of a pair.
+        """
+        i = self.first_word[pair]
+        split = self.splits[i]
+        for j in range(len(split) - 1):
+            if split[j] == pair[0] and split[j + 1] == pair[1]:
+                return i, j
+
+    def token_count(self):
+        """
+        Number of tokens in the corpus, counting each word by its frequency.
+        """
+        return sum(len(split) * freq for split, freq in zip(self.splits, self.freqs))
+
+    def pair_frequency(self, pair):
+        return self.pair_freqs.get(pair, 0)
+
+    def pair_table_size(self):
+        """
+        Number of distinct pairs left in the corpus.
+        """
+        return len(self.pair_freqs)
+
+    def merge(self, pair, merged=None):
+        """
+        Merge a pair in every word that contains it and update the index.
+        Returns the number of words it touched.
+        """
+        if merged is None:
+            merged = pair[0] + pair[1]
+        pair_freqs = self.pair_freqs
+        pair_words = self.pair_words
+        first_word = self.first_word
+        changed = set()
+        touched = pair_words.pop(pair)
+        for i in touched:
+            removed, added = merge_in_place(
+                self.splits[i], pair, merged, self.word_pairs[i], changes=True
+            )
+
+            freq = self.freqs[i]
+            for p in removed:
+                pair_freqs[p] -= freq
+                if not pair_freqs[p]:
+                    del pair_freqs[p]
+                if p != pair:
+                    words = pair_words[p]
+                    words.discard(i)
+                    if not words:
+                        del pair_words[p]
+                        del first_word[p]
+                    elif first_word[p] == i:
+                        first_word[p] = min(words)
+                changed.add(p)
+            for p in added:
+                pair_freqs[p] += freq
+                pair_words[p].add(i)
+                if i < first_word.get(p, i + 1):
+                    first_word[p] = i
+                changed.add(p)
+
+        changed.discard(pair)
+        del first_word[pair]
+        for p in changed:
+            if p in pair_freqs:
+                heapq.heappush(self.heap, (-pair_freqs[p], first_word[p], p))
+        return len(touched)
+
+
+class ByteVocab:
+    """
+    Integer token ids over a 256-entry byte base vocabulary.
+
+    Ids 0-255 are the single bytes. Each merge gets the next free id, unless
+    a token with the same bytes already exists, in which case that id is
+    reused (the same way two string tokens with equal text were one token).
+    """
+
+    def __init__(self):
+        self.id_to_bytes = [bytes([b]) for b in range(256)]
+        self.bytes_to_id = {b: i for i, b in enumerate(self.id_to_bytes)}
+        # Display form of each token, as the tokenizers used to produce it
+        self.id_to_str = [b.decode("utf-8", errors="replace") for b in self.id_to_bytes]
+
+    def __len__(self):
+        return len(self.id_to_bytes)
+
+    def add_merge(self, pair):
+        """
+        Id for the token made by merging a pair of ids.
+        """
+        token = self.id_to_bytes[pair[0]] + self.id_to_bytes[pair[1]]
+        token_id = self.bytes_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.id_to_bytes)
+            self.id_to_bytes.append(token)
+            self.bytes_to_id[token] = token_id
+            self.id_to_str.append(token.decode("utf-8", errors="replace"))
+        return token_id
+
+    def vocab(self, ids):
+        """
+        Token bytes -> id for the given ids, in id order. Keyed by bytes, so
+        tokens that only differ in bytes shown as U+FFFD stay distinct.
+        """
+        return {self.id_to_bytes[i]: i for i in sorted(set(ids))}
+
+    def display(self, token_id):
+        """
+        A token's text, or its bytes when they are not valid UTF-8 by
+        themselves, so no two tokens display alike.
+        """
+        token = self.id_to_bytes[token_id]
+        try:
+            return token.decode("utf-8")
+        except UnicodeDecodeError:
+            return token
+
+    def decode(self, ids):
+        """
+        Turn token ids back into text. Lossless for any ids produced by
+        encoding valid text.
+        """
+        return b"".join(self.id_to_bytes[i] for i in ids).decode(
+            "utf-8", errors="replace"
+        )
+
+
+class TrieEncoder:
+    """
+    Encode text in one pass over a byte trie of the learned tokens, giving
+    the same ids as applying every merge in order.
+
+    At each position the longest token in the trie is tried first. A token
+    is only kept if it forms a valid pair with the token before it, meaning
+    the merges turn their joined bytes back into exactly those two tokens;
+    checks are memoized. When no token fits, the encoder backtracks to a
+    shorter token at an earlier position and marks the dead position so it
+    is not tried again.
+
+    Only tokens that encode to themselves go in the trie, since no other
+    token can appear in an encoding. This is exact when every merge makes a
+    new token and no pair is merged twice, which is what `exact` reports;
+    otherwise encode falls back to merge_by_rank over the whole text.
+    """
+
+    def __init__(self, byte_vocab, merge_ids, merge_table):
+        self.id_to_bytes = byte_vocab.id_to_bytes
+        self.ranks = merge_ranks(merge_ids)
+        self.merge_table = merge_table
+        self.exact = (
+            len(self.ranks) == len(merge_ids)
+            and len(self.id_to_bytes) == 256 + len(merge_ids)
+        )
+        self._valid_pairs = {}
+
+        # Each node maps a byte to its child; the token ending there sits under None
+        self.root = {}
+        for token_id, token in enumerate(self.id_to_bytes):
+            if len(token) > 1 and self._encode_ranked(token) != [token_id]:
+                continue
+            node = self.root
+            for b in token:
+                node = node.setdefault(b, {})
+            node[None] = token_id
+
+        # Longest trie token that is a strict prefix of each trie token
+        self.shorter = {}
+        self._link_prefixes(self.root, None)
+
+    def _link_prefixes(self, node, prefix_id):
+        token_id = node.get(None)
+        if token_id is not None:
+            self.shorter[token_id] = prefix_id
+            prefix_id = token_id
+        for b, child in node.items():
+            if b is not None:
+                self._link_prefixes(child, prefix_id)
+
+    def _encode_ranked(self, data):
+        return merge_by_rank(list(data), self.ranks, self.merge_table)
+
+    def _is_valid_pair(self, left, right):
+        pair = (left, right)
+        valid = self._valid_pairs.get(pair)
+        if valid is None:
+            data = self.id_to_bytes[left] + self.id_to_bytes[right]
+            valid = self._valid_pairs[pair] = self._encode_ranked(data) == [left, right]
+        return valid
+
+    def _longest_match(self, data, pos):
+        node = self.root
+        best = None
+        for i in range(pos, len(data)):
+            node = node.get(data[i])
+            if node is None:
+                break
+            best = node.get(None, best)
+        return best
+
+    def encode(self, data):
+        """
+        Token ids for a bytes object.
+        """
+        if not self.exact:
+            return self._encode_ranked(data)
+
+        n = len(data)
+        id_to_bytes = self.id_to_bytes
+        alive = bytearray(b"\x01") * (n + 1)
+        tokens = []
+        pos = 0
+        token = self._longest_match(data, 0) if n else None
+        while token is not None:
+            last = tokens[-1] if tokens else None
+            while True:
+                end = pos + len(id_to_bytes[token])
+                if alive[end] and (last is None or self._is_valid_pair(last, token)):
+                    tokens.append(token)
+                    pos = end
+                    token = self._longest_match(data, pos) if pos < n else None
+                    break
+                shorter = self.shorter[token]
+                if shorter is not None:
+                    token = shorter
+                    continue
+                # Nothing fits after `last`: step back and try a shorter one
+                alive[pos] = 0
+                tokens.pop()
+                pos -= len(id_to_bytes[last])
+                token = last
+                break
+        return tokens
+
+
+class WordCache:
+    """
+    Bounded LRU cache of pretokenized word -> tokens, with hit/miss counters.
+    A maxsize of 0 turns caching off.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, word):
+        tokens = self._entries.get(word)
+        if tokens is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(word)
+        self.hits += 1
+        return tokens
+
+    def put(self, word, tokens):
+        if self.maxsize <= 0:
+            return
+        self._entries[word] = tuple(tokens)
+        self._entries.move_to_end(word)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class TokenizerMetrics:
+    """
+    Training and encoding measurements for a tokenizer created with
+    metrics=TokenizerMetrics(). Tokenizers without one skip all of this.
+
+    Training keeps one record per merge in `merge_records`: the merge index,
+    the pair, its frequency, how many words it touched, how many distinct
+    pairs were left afterwards and how long the merge took (picking the
+    pair included). train() starts the records over, continue_training()
+    adds to them. Encoding only keeps running totals. `callback`, if given,
+    is called with ("merge", record) after every merge and ("encode",
+    record) after every encode() call, e.g. to forward them to a metrics
+    pipeline.
+
+    Only encoding done in this process is recorded; batch workers get their
+    own copies.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        self.reset_merges()
+        self.encode_calls = 0
+        self.encode_bytes = 0
+        self.encode_words = 0
+        self.encode_tokens = 0
+        self.pretokenize_ns = 0
+        self.merge_ns = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def reset_merges(self):
+        """
+        Forget the merge records, as training from scratch does. Encoding
+        totals are kept.
+        """
+        self.merge_records = []
+
+    def __getstate__(self):
+        # Callbacks are often lambdas or bound to live connections
+        state = self.__dict__.copy()
+        state["callback"] = None
+        return state
+
+    def record_merge(self, pair, frequency, words_touched, pair_table_size, elapsed_ns):
+        record = {
+            "merge": len(self.merge_records),
+            "pair": pair,
+            "frequency": frequency,
+            "words_touched": words_touched,
+            "pair_table_size": pair_table_size,
+            "time_ns": elapsed_ns,
+        }
+        self.merge_records.append(record)
+        if self.callback is not None:
+            self.callback("merge", record)
+
+    def record_encode(self, nbytes, words, tokens, pretokenize_ns, merge_ns,
+                      cache_hits=0, cache_misses=0):
+        self.encode_calls += 1
+        self.encode_bytes += nbytes
+        self.encode_words += words
+        self.encode_tokens += tokens
+        self.pretokenize_ns += pretokenize_ns
+        self.merge_ns += merge_ns
+        self.cache_hits += cache_hits
+        self.cache_misses += cache_misses
+        if self.callback is not None:
+            self.callback("encode", {
+                "bytes": nbytes,
+                "words": words,
+                "tokens": tokens,
+                "pretokenize_ns": pretokenize_ns,
+                "merge_ns": merge_ns,
+                "cache_hits": cache_hits,
+                "cache_misses": cache_misses,
+            })
+
+    def summary(self):
+        """
+        Totals as a flat dict of numbers, ready to export.
+        """
+        train_ns = sum(record["time_ns"] for record in self.merge_records)
+        encode_ns = self.pretokenize_ns + self.merge_ns
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "merges": len(self.merge_records),
+            "train_merge_ns": train_ns,
+            "words_touched": sum(record["words_touched"] for record in self.merge_records),
+            "encode_calls": self.encode_calls,
+            "encode_bytes": self.encode_bytes,
+            "encode_words": self.encode_words,
+            "encode_tokens": self.encode_tokens,
+            "pretokenize_ns": self.pretokenize_ns,
+            "merge_ns": self.merge_ns,
+            "encode_bytes_per_s": self.encode_bytes / (encode_ns / 1e9) if encode_ns else 0.0,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
+
+
+def run_merges(tokenizer, count):
+    """
+    Learn up to `count` more merges with the tokenizer's trainer, recording
+    each one when the tokenizer has metrics.
+    """
+    trainer = tokenizer.trainer
+    metrics = tokenizer.metrics
+    for _ in range(count):
+        if metrics is not None:
+            start = time.perf_counter_ns()
+        best_pair = trainer.best_pair()
+        if best_pair is None:
+            break
+        tokenizer._add_merge(best_pair)
+        if metrics is None:
+            trainer.merge(best_pair, tokenizer.merge_table[best_pair])
+            continue
+        frequency = trainer.pair_frequency(best_pair)
+        touched = trainer.merge(best_pair, tokenizer.merge_table[best_pair])
+        metrics.record_merge(
+            best_pair, frequency, touched, trainer.pair_table_size(),
+            time.perf_counter_ns() - start,
+        )
+
+
+# Binary model file: a fixed header followed by the merges as packed uint32
+# (left, right) id pairs and then the vocabulary as packed uint32 token ids.
+MODEL_MAGIC = b"TOKMODEL"
+MODEL_VERSION = 1
+MODEL_HEADER = struct.Struct("<8sIIII")
+MODEL_KINDS = ("bpe", "sentencepiece")
+
+
+def _uint32_list(view):
+    """
+    Read packed little-endian uint32 values out of a memoryview.
+    """
+    if sys.byteorder == "little":
+        with view.cast("I") as ints:
+            return ints.tolist()
+    return list(struct.unpack(f"<{len(view) // 4}I", view))
+
+
+def save_model(tokenizer, path):
+    """
+    Write a trained tokenizer's merges and vocabulary to a binary model file.
+    """
+    kind = MODEL_KINDS.index("bpe" if isinstance(tokenizer, BPETokenizer) else "sentencepiece")
+    vocab_ids = list(tokenizer.vocab.values())
+    with open(path, "wb") as f:
+        f.write(MODEL_HEADER.pack(
+            MODEL_MAGIC, MODEL_VERSION, kind, len(tokenizer.merge_ids), len(vocab_ids)
+        ))
+        f.write(struct.pack(f"<{2 * len(tokenizer.merge_ids)}I",
+                            *(i for pair in tokenizer.merge_ids for i in pair)))
+        f.write(struct.pack(f"<{len(vocab_ids)}I", *vocab_ids))
+
+
+def load_model(path):
+    """
+    Load a tokenizer written by save_model. The merges are replayed to
+    rebuild the vocabulary and merge tables, so each process that loads a
+    model holds its own copy.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < MODEL_HEADER.size:
+        raise ValueError(f"{path} is not a tokenizer model file")
+    magic, version, kind, num_merges, num_vocab = MODEL_HEADER.unpack_from(data)
+    if magic != MODEL_MAGIC:
+        raise ValueError(f"{path} is not a tokenizer model file")
+    if version != MODEL_VERSION:
+        raise ValueError(f"unsupported model version {version} in {path}")
+    if kind >= len(MODEL_KINDS):
+        raise ValueError(f"unknown model kind {kind} in {path}")
+    merges_end = MODEL_HEADER.size + 8 * num_merges
+    if len(data) != merges_end + 4 * num_vocab:
+        raise ValueError(f"{path} is truncated or corrupt")
+
+    with memoryview(data) as view:
+        with view[MODEL_HEADER.size : merges_end] as merges_view:
+            flat = _uint32_list(merges_view)
+        with view[merges_end:] as vocab_view:
+            vocab_ids = _uint32_list(vocab_view)
+
+    cls = BPETokenizer if MODEL_KINDS[kind] == "bpe" else SentencePieceBPE
+    tokenizer = cls(num_merges=num_merges)
+    try:
+        tokenizer.load_merges(list(zip(flat[0::2], flat[1::2])), vocab_ids)
+    except ValueError as e:
+        raise ValueError(f"{path} is corrupt: {e}") from None
+    return tokenizer
+
+
+def export_json(tokenizer, path):
+    """
+    Write a tokenizer's merges and vocabulary as JSON for use by other tools.
+
+    Merges are listed both as id pairs and as readable strings; `tokens` maps
+    every id to its bytes (as a latin-1 string) so ids can be decoded
+    without this module, and `vocab` lists the ids in the vocabulary.
+    """
+    model = {
+        "type": "bpe" if isinstance(tokenizer, BPETokenizer) else "sentencepiece",
+        "version": MODEL_VERSION,
+        "merges": [list(pair) for pair in tokenizer.merge_ids],
+        "merge_strings": [list(pair) for pair in tokenizer.merges],
+        "tokens": [token.decode("latin-1") for token in tokenizer.byte_vocab.id_to_bytes],
+        "vocab": list(tokenizer.vocab.values()),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(model, f, ensure_ascii=False)
+
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(tokenizer, path):
+    """
+    Pickle a tokenizer along with its trainer (splits, pair counts and
+    index), so training can continue later without redoing earlier merges.
+    """
+    if tokenizer.trainer is None:
+        raise ValueError("no training state to save: train with resumable=True first")
+    with open(path, "wb") as f:
+        pickle.dump({"version": CHECKPOINT_VERSION, "tokenizer": tokenizer}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_checkpoint(cls, path):
+    """
+    Load a `cls` tokenizer saved with save_checkpoint. Only load checkpoints
+    you trust, as they are pickles.
+    """
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"unsupported checkpoint version in {path}")
+    tokenizer = checkpoint["tokenizer"]
+    if not isinstance(tokenizer, cls):
+        raise ValueError(f"{path} does not hold a {cls.__name__} checkpoint")
+    return tokenizer
+
+
+def train_sweep(tokenizer, corpus, merge_counts):
+    """
+    Train once up to the largest merge count, taking a snapshot each time the
+    merge list reaches one of `merge_counts`.
+
+    Merge lists are prefix-stable, so the snapshot at k merges is exactly the
+    model that training with num_merges=k would give. Each snapshot holds the
+    vocabulary and the token count and compression ratio (bytes per token)
+    over the training words or chunks. The tokenizer ends up trained to the
+    largest count.
+    """
+    tokenizer.num_merges = 0
+    tokenizer.train(corpus, resumable=True)
+    num_bytes = tokenizer.trainer.token_count()
+
+    snapshots = []
+    for count in sorted(set(merge_counts)):
+        tokenizer.continue_training(count - tokenizer.num_merges)
+        tokens = tokenizer.trainer.token_count()
+        snapshots.append({
+            "num_merges": count,
+            "merges_learned": len(tokenizer.merges),
+            "vocab_size": len(tokenizer.vocab),
+            "tokens": tokens,
+            "bytes": num_bytes,
+            "compression_ratio": num_bytes / tokens if tokens else 0.0,
+            "vocab": dict(tokenizer.vocab),
+        })
+    return snapshots
+
+
+# Tokenizer copy held by each batch worker process
+_worker_tokenizer = None
+
+
+def _without_trainer(tokenizer):
+    """
+    Shallow copy of a tokenizer without its training state, which workers
+    never need and which is much larger than the merges.
+    """
+    if tokenizer.trainer is None:
+        return tokenizer
+    shipped = copy.copy(tokenizer)
+    shipped.trainer = None
+    return shipped
+
+
+def _init_batch_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_chunk(method, texts):
+    fn = getattr(_worker_tokenizer, method)
+    return [fn(text) for text in texts]
+
+
+def tokenize_batch(tokenizer, texts, workers=1, chunk_size=None, method="tokenize"):
+    """
+    Tokenize many texts, optionally spread over a pool of worker processes.
+
+    The tokenizer (and so its learned merges) is sent to each worker once when
+    the pool starts, then texts are sent over in chunks. Results come back in
+    input order. `method` picks "tokenize" (token strings) or "encode" (ids).
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) < 2:
+        fn = getattr(tokenizer, method)
+        return [fn(text) for text in texts]
+
+    if chunk_size is None:
+        # A few chunks per worker keeps the pool busy when chunks finish unevenly
+        chunk_size = max(1, math.ceil(len(texts) / (workers * 4)))
+    chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(_without_trainer(tokenizer),),
+    ) as pool:
+        for chunk_tokens in pool.map(_tokenize_chunk, [method] * len(chunks), chunks):
+            results.extend(chunk_tokens)
+    return results
+
+
+def _count_chunk(texts):
+    counts = Counter()
+    for text in texts:
+        counts.update(_worker_tokenizer.tokenize(text))
+    return counts
+
+
+def count_tokens(tokenizer, texts, workers=1, chunk_size=1000):
+    """
+    Token frequencies over any iterable of texts, counted as the tokens are
+    produced so no per-text token lists are kept.
+
+    With workers above 1, each worker counts its chunks of texts and the
+    counters are added together. Only a few chunks are in flight at a
+    time, so memory is bounded by the vocabulary and chunk size, not the
+    corpus. Counts are the same either way; the order of tied tokens in
+    most_common() may differ with workers.
+    """
+    counts = Counter()
+    if workers <= 1:
+        for text in texts:
+            counts.update(tokenizer.tokenize(text))
+        return counts
+
+    texts = iter(texts)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_batch_worker,
+        initargs=(_without_trainer(tokenizer),),
+    ) as pool:
+        running = set()
+        while True:
+            while len(running) < 2 * workers:
+                chunk = list(itertools.islice(texts, chunk_size))
+                if not chunk:
+                    break
+                running.add(pool.submit(_count_chunk, chunk))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                counts.update(future.result())
+    return counts
+
+
+class MergeTokenizer:
+    """
+    Merge bookkeeping and model files shared by BPETokenizer and
+    SentencePieceBPE. Subclasses set up `merges`, `merge_ids`,
+    `merge_table`, `vocab`, `byte_vocab` and `trainer`, and override
+    _merges_changed() to refresh whatever they derive from the merges.
+    """
+
+    def _reset_merges(self):
+        self.merges = []
+        self.merge_ids = []
+        self.merge_table = {}
+        self.byte_vocab = ByteVocab()
+
+    def _add_merge(self, pair):
+        id_to_str = self.byte_vocab.id_to_str
+        self.merges.append((id_to_str[pair[0]], id_to_str[pair[1]]))
+        self.merge_ids.append(pair)
+        self.merge_table.setdefault(pair, self.byte_vocab.add_merge(pair))
+
+    def _merges_changed(self):
+        pass
+
+    def load_merges(self, merge_ids, vocab_ids):
+        """
+        Rebuild the tokenizer from learned merge id pairs and vocabulary ids.
+        Raises ValueError if a merge or vocabulary id refers to a token that
+        does not exist yet.
+        """
+        self._reset_merges()
+        self.trainer = None
+        for i, pair in enumerate(merge_ids):
+            pair = tuple(pair)
+            if not all(0 <= token_id < len(self.byte_vocab) for token_id in pair):
+                raise ValueError(f"merge {i} {pair} refers to an unknown token id")
+            self._add_merge(pair)
+        vocab_ids = list(vocab_ids)
+        for token_id in vocab_ids:
+            if not 0 <= token_id < len(self.byte_vocab):
+                raise ValueError(f"vocabulary id {token_id} refers to an unknown token")
+        self._merges_changed()
+        self.vocab = self.byte_vocab.vocab(vocab_ids)
+
+    def save(self, path):
+        """
+        Save the merges and vocabulary to a binary model file.
+        """
+        save_model(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a tokenizer saved with save().
+        """
+        tokenizer = load_model(path)
+        if not isinstance(tokenizer, cls):
+            raise ValueError(f"{path} does not hold a {cls.__name__} model")
+        return tokenizer
+
+    def export_json(self, path):
+        """
+        Save the merges and vocabulary as JSON.
+        """
+        export_json(self, path)
+
+
+class BPETokenizer(MergeTokenizer):
     """
     Byte Pair Encoding tokenizer with GPT-2 style pretokenization.
+
+    Tokens are integer ids over a byte base vocabulary (see ByteVocab).
+    `merges` keeps the learned merges as readable string pairs, `merge_ids`
+    the same merges as (id, id) pairs, and `merge_table` maps each (id, id)
+    pair to the id it merges into.
     """
 
-    def __init__(self, num_merges=1000):
+    def __init__(self, num_merges=1000, cache_size=10000, metrics=None):
         self.num_merges = num_merges
-        self.merges = []
+        self.metrics = metrics
+        self._reset_merges()
+        self.ranks = {}
         self.vocab = {}
+        self.cache = WordCache(cache_size)
+        self.trainer = None
 
-    def train(self, corpus):
+    def train(self, corpus, resumable=False):
         """
         Train the BPE tokenizer on the corpus that we provide.
+
+        The training state is dropped afterwards unless `resumable` is set,
+        which continue_training() and save_checkpoint() need.
         """
-        # Pretokenize corpus
-        words = []
+        # Start from the byte vocabulary; cached encodings belong to old merges
+        self._reset_merges()
+        self.cache.clear()
+        if self.metrics is not None:
+            self.metrics.reset_merges()
+
+        # Pretokenize corpus, counting words as we go so the corpus can be
+        # any iterator of lines and is only read once
+        word_freqs = Counter()
         for text in corpus:
-            words.extend(gpt2_pretokenize(text))
+            word_freqs.update(gpt2_pretokenize(text))
 
-        # Convert to bytes
-        word_freqs = Counter(words)
-        splits = {}
-        for word, freq in word_freqs.items():
-            byte_list = list(word.encode("utf-8"))
-            # Convert bytes to separate tokens initially
-            splits[word] = [
-                bytes([b]).decode("utf-8", errors="replace") for b in byte_list
-            ]
+        # Convert to bytes, each byte is its own token id initially
+        splits = [list(word.encode("utf-8")) for word in word_freqs]
 
         # Do our merges
-        for _ in range(self.num_merges):
-            # Count all pairs
-            pair_freqs = defaultdict(int)
-            for word, freq in word_freqs.items():
-                split = splits[word]
-                pairs = get_byte_pairs(split)
-                for pair in pairs:
-                    pair_freqs[pair] += freq
-
-            if not pair_freqs:
-                break
+        self.trainer = MergeTrainer(splits, list(word_freqs.values()))
+        self._run_merges(self.num_merges)
+        if not resumable:
+            self.trainer = None
 
-            # Find most frequent pair
-            best_pair = max(pair_freqs, key=pair_freqs.get)
-            self.merges.append(best_pair)
+    def _run_merges(self, count):
+        """
+        Learn up to `count` more merges with the current trainer.
+        """
+        trainer = self.trainer
+        run_merges(self, count)
+        self._merges_changed()
 
-            # Merge the pair in all words
-            for word in splits:
-                splits[word] = merge_pair(splits[word], best_pair)
+        self.vocab = self.byte_vocab.vocab(i for word in trainer.splits for i in word)
 
-        # Build vocabulary
-        vocab_set = set()
-        for word in splits.values():
-            vocab_set.update(word)
-        self.vocab = {token: i for i, token in enumerate(sorted(vocab_set))}
+    def continue_training(self, extra_merges):
+        """
+        Learn `extra_merges` more merges, picking up where training stopped.
 
-    def tokenize(self, text):
+        Gives the same merges as training from scratch with the larger
+        num_merges.
         """
-        Tokenize the text using learned merges.
+        if self.trainer is None:
+            raise ValueError(
+                "no training state: call train(resumable=True) or load_checkpoint() first"
+            )
+        self.num_merges += extra_merges
+        self._run_merges(extra_merges)
+
+    def train_sweep(self, corpus, merge_counts):
         """
-        words = gpt2_pretokenize(text)
-        tokens = []
+        Train once and return a snapshot (vocab, token count, compression
+        ratio) at each of the given merge counts. See train_sweep().
+        """
+        return train_sweep(self, corpus, merge_counts)
+
+    def save_checkpoint(self, path):
+        """
+        Save the tokenizer together with its training state, so training can
+        be resumed after load_checkpoint().
+        """
+        save_checkpoint(self, path)
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """
+        Load a tokenizer saved with save_checkpoint().
+        """
+        return load_checkpoint(cls, path)
 
+    def train_file(self, path, resumable=False):
+        """
+        Train on a text file, streaming it one line at a time.
+        """
+        self.train(read_lines(path), resumable=resumable)
+
+    def _merges_changed(self):
+        self.ranks = merge_ranks(self.merge_ids)
+        self.cache.clear()
+
+    def _encode_word(self, word):
+        cached = self.cache.get(word)
+        if cached is not None:
+            return cached
+
+        # Bytes are our input format, apply merges lowest rank first
+        split = merge_by_rank(list(word.encode("utf-8")), self.ranks, self.merge_table)
+        self.cache.put(word, split)
+        return split
+
+    def encode(self, text, return_offsets=False):
+        """
+        Encode the text into token ids using learned merges.
+
+        With return_offsets=True, returns (id, start, end) triples with each
+        token's character span in the text instead.
+        """
+        if return_offsets:
+            return list(self.iter_tokens(text, with_offsets=True))
+        if self.metrics is not None:
+            return self._encode_measured(text)
+        ids = []
+        for word in gpt2_pretokenize(text):
+            ids.extend(self._encode_word(word))
+        return ids
+
+    def _encode_measured(self, text):
+        cache = self.cache
+        hits, misses = cache.hits, cache.misses
+        start = time.perf_counter_ns()
+        words = gpt2_pretokenize(text)
+        pretokenized = time.perf_counter_ns()
+        ids = []
         for word in words:
-            # Convert to bytes as that is our input format
-            byte_list = list(word.encode("utf-8"))
-            split = [bytes([b]).decode("utf-8", errors="replace") for b in byte_list]
+            ids.extend(self._encode_word(word))
+        end = time.perf_counter_ns()
+        self.metrics.record_encode(
+            len(text.encode("utf-8")), len(words), len(ids),
+            pretokenized - start, end - pretokenized,
+            cache.hits - hits, cache.misses - misses,
+        )
+        return ids
 
-            # Apply merges in order
-            for merge in self.merges:
-                split = merge_pair(split, merge)
+    def iter_tokens(self, text_or_file, with_offsets=False, block_size=1 << 16):
+        """
+        Tokenize a string or a file-like object lazily, yielding token
+        strings, or (id, start, end) with character offsets when
+        `with_offsets` is set.
 
-            tokens.extend(split)
+        Files are read `block_size` characters at a time, so memory use
+        stays flat however long the input is; the tokens are the same as
+        tokenize() on the whole text.
+        """
+        id_to_str = self.byte_vocab.id_to_str
+        id_to_bytes = self.byte_vocab.id_to_bytes
+        for word, start in iter_pretokens(text_or_file, block_size):
+            tokens = self._encode_word(word)
+            if with_offsets:
+                for token, (token_start, token_end) in zip(
+                    tokens, token_spans(word, tokens, id_to_bytes, start)
+                ):
+                    yield token, token_start, token_end
+            else:
+                for token in tokens:
+                    yield id_to_str[token]
 
-        return tokens
+    def decode(self, ids):
+        """
+        Turn token ids back into the original text.
+        """
+        return self.byte_vocab.decode(ids)
 
+    def tokenize(self, text):
+        """
+        Tokenize the text using learned merges.
+        """
+        id_to_str = self.byte_vocab.id_to_str
+        return [id_to_str[i] for i in self.encode(text)]
+
+    def encode_batch(self, texts, workers=1):
+        """
+        Encode a list of texts into ids, using `workers` processes when above 1.
+        """
+        return tokenize_batch(self, texts, workers=workers, method="encode")
+
+    def tokenize_batch(self, texts, workers=1):
+        """
+        Tokenize a list of texts, using `workers` processes when above 1.
+        """
+        return tokenize_batch(self, texts, workers=workers)
 
-class SentencePieceBPE:
+    def count_tokens(self, texts, workers=1):
+        """
+        Token frequencies over texts without keeping the token lists.
+        """
+        return count_tokens(self, texts, workers=workers)
+
+
+class SentencePieceBPE(MergeTokenizer):
     """
     SentencePiece variant of BPE - no pretokenization, treats entire text as character sequence.
+
+    encoder="trie" encodes with TrieEncoder, a single pass over the text that
+    gives the same tokens as the default of applying each merge in turn.
     """
 
-    def __init__(self, num_merges=1000):
+    def __init__(self, num_merges=1000, chunking="fixed", chunk_size=1000, encoder="merges",
+                 metrics=None):
+        if chunking not in CHUNKING_MODES:
+            raise ValueError(f"unknown chunking mode: {chunking!r}")
+        if encoder not in SP_ENCODERS:
+            raise ValueError(f"unknown encoder: {encoder!r}")
         self.num_merges = num_merges
-        self.merges = []
+        self.chunking = chunking
+        self.chunk_size = chunk_size
+        self.encoder = encoder
+        self.metrics = metrics
+        self.trie = None
+        self._reset_merges()
         self.vocab = {}
+        self.trainer = None
 
-    def train(self, corpus):
-        # Concatenate all text as there is no pretokenization
-        full_text = " ".join(corpus)
-        byte_list = list(full_text.encode("utf-8"))
-        splits = {}
-
-        # the entire corpus is diviced into chunks to make training easier.
-        chunk_size = 1000
-        chunks = [
-            full_text[i : i + chunk_size] for i in range(0, len(full_text), chunk_size)
-        ]
+    def train(self, corpus, resumable=False):
+        """
+        Train on the corpus. As for BPETokenizer, the training state is only
+        kept when `resumable` is set.
 
-        for chunk in chunks:
-            byte_list = list(chunk.encode("utf-8"))
-            splits[chunk] = [
-                bytes([b]).decode("utf-8", errors="replace") for b in byte_list
-            ]
+        With chunking="fixed" the corpus is joined with spaces and cut into
+        chunk_size windows, and identical windows are only counted once.
+        "lines" cuts each text into its own windows and "whitespace" splits
+        texts before each whitespace run; both count repeated chunks with
+        their real frequency while still merging each distinct chunk once.
+        """
+        self._reset_merges()
+        if self.metrics is not None:
+            self.metrics.reset_merges()
 
-        chunk_freqs = {chunk: 1 for chunk in chunks}
+        # There is no pretokenization, so the corpus is divided into chunks
+        # to make training easier.
+        if self.chunking == "fixed":
+            # Identical chunks collapse into one entry with frequency 1
+            chunk_freqs = dict.fromkeys(iter_chunks(corpus, self.chunk_size), 1)
+        elif self.chunking == "lines":
+            chunk_freqs = Counter(iter_line_chunks(corpus, self.chunk_size))
+        else:
+            chunk_freqs = Counter(iter_whitespace_chunks(corpus))
+        splits = [list(chunk.encode("utf-8")) for chunk in chunk_freqs]
+        freqs = list(chunk_freqs.values())
 
         # Perform merges
-        for _ in range(self.num_merges):
-            # Count all pairs
-            pair_freqs = defaultdict(int)
-            for chunk, freq in chunk_freqs.items():
-                split = splits[chunk]
-                pairs = get_byte_pairs(split)
-                for pair in pairs:
-                    pair_freqs[pair] += freq
-
-            if not pair_freqs:
-                break
+        self.trainer = MergeTrainer(splits, freqs)
+        self._run_merges(self.num_merges)
+        if not resumable:
+            self.trainer = None
 
-            # Find most frequent pair
-            best_pair = max(pair_freqs, key=pair_freqs.get)
-            self.merges.append(best_pair)
+    def _run_merges(self, count):
+        trainer = self.trainer
+        run_merges(self, count)
+        self._merges_changed()
 
-            # Merge the pair in all chunks
-            for chunk in splits:
-                splits[chunk] = merge_pair(splits[chunk], best_pair)
+        self.vocab = self.byte_vocab.vocab(i for chunk in trainer.splits for i in chunk)
 
-        # Build vocabulary
-        vocab_set = set()
-        for chunk in splits.values():
-            vocab_set.update(chunk)
-        self.vocab = {token: i for i, token in enumerate(sorted(vocab_set))}
+    def continue_training(self, extra_merges):
+        """
+        Learn `extra_merges` more merges, picking up where training stopped.
+        """
+        if self.trainer is None:
+            raise ValueError(
+                "no training state: call train(resumable=True) or load_checkpoint() first"
+            )
+        self.num_merges += extra_merges
+        self._run_merges(extra_merges)
+
+    def train_sweep(self, corpus, merge_counts):
+        """
+        Train once and return a snapshot (vocab, token count, compression
+        ratio) at each of the given merge counts. See train_sweep().
+        """
+        return train_sweep(self, corpus, merge_counts)
+
+    def save_checkpoint(self, path):
+        """
+        Save the tokenizer together with its training state.
+        """
+        save_checkpoint(self, path)
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """
+        Load a tokenizer saved with save_checkpoint().
+        """
+        return load_checkpoint(cls, path)
+
+    def train_file(self, path, resumable=False):
+        """
+        Train on a text file, streaming it one line at a time.
+        """
+        self.train(read_lines(path), resumable=resumable)
+
+    def _merges_changed(self):
+        self.trie = None
+
+    def encode(self, text):
+        if self.metrics is not None:
+            start = time.perf_counter_ns()
+            ids = self._encode(text)
+            self.metrics.record_encode(
+                len(text.encode("utf-8")), 0, len(ids), 0, time.perf_counter_ns() - start
+            )
+            return ids
+        return self._encode(text)
+
+    def _encode(self, text):
+        if self.encoder == "trie":
+            if self.trie is None:
+                self.trie = TrieEncoder(self.byte_vocab, self.merge_ids, self.merge_table)
+            return self.trie.encode(text.encode("utf-8"))
 
-    def tokenize(self, text):
         # Convert to bytes
-        byte_list = list(text.encode("utf-8"))
-        split = [bytes([b]).decode("utf-8", errors="replace") for b in byte_list]
+        split = list(text.encode("utf-8"))
 
         # Apply merges in order
-        for merge in self.merges:
-            split = merge_pair(split, merge)
+        for pair in self.merge_ids:
+            split = merge_pair(split, pair, self.merge_table[pair])
 
         return split
 
+    def decode(self, ids):
+        return self.byte_vocab.decode(ids)
+
+    def tokenize(self, text):
+        id_to_str = self.byte_vocab.id_to_str
+        return [id_to_str[i] for i in self.encode(text)]
+
+    def encode_batch(self, texts, workers=1):
+        """
+        Encode a list of texts into ids, using `workers` processes when above 1.
+        """
+        return tokenize_batch(self, texts, workers=workers, method="encode")
+
+    def tokenize_batch(self, texts, workers=1):
+        """
+        Tokenize a list of texts, using `workers` processes when above 1.
+        """
+        return tokenize_batch(self, texts, workers=workers)
+
+    def count_tokens(self, texts, workers=1):
+        """
+        Token frequencies over texts without keeping the token lists.
+        """
+        return count_tokens(self, texts, workers=workers)
+
 
 if __name__ == "__main__":
     # Example usage
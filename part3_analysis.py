@@ -1,53 +1,338 @@
+import contextlib
 import csv
+import hashlib
+import io
+import json
 import os
+import sys
 import time
-from collections import Counter
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-from part1_regex import preprocess_part1
-from part2_tokenization import space_tokenize, BPETokenizer, SentencePieceBPE
+from freq_stats import summarize
+from part1_regex import preprocess_batch, preprocess_part1
+import part2_tokenization
+from part2_tokenization import MODEL_VERSION, space_tokenize, BPETokenizer, SentencePieceBPE
 
 SENTIMENT_PATH = "datasets/sentiment140_noemoticon_10000.csv"
 WIKI_PATH = "datasets/simple_english_wikipedia_10000.txt"
 OUTPUT_DIR = "output"
+MODEL_CACHE_DIR = os.path.join(OUTPUT_DIR, "model_cache")
 NUM_MERGES = 1000
+SWEEP_MERGES = (100, 250, 500, 1000, 2000)
 
 
-def load_sentiment140():
-    texts = []
+def _source_digest(module):
+    with open(module.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Cached models are only reused by the exact training code that built them
+TRAINER_VERSION = f"{MODEL_VERSION}:{_source_digest(part2_tokenization)}"
+
+
+def iter_sentiment140():
     with open(SENTIMENT_PATH, encoding="utf-8", errors="replace") as f:
         reader = csv.reader(f)
         for row in reader:
-            texts.append(row[5])
-    return texts
+            yield row[5]
 
 
-def load_wikipedia():
-    texts = []
+def iter_wikipedia():
     with open(WIKI_PATH, encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             if line:
-                texts.append(line)
-    return texts
+                yield line
 
 
-def get_vocab_and_freqs(tokenized_texts):
-    counter = Counter()
-    for tokens in tokenized_texts:
-        counter.update(tokens)
-    vocab = set(counter.keys())
-    return vocab, counter
+def load_sentiment140():
+    return list(iter_sentiment140())
+
+
+def load_wikipedia():
+    return list(iter_wikipedia())
 
 
-def time_tokenization(fn, texts):
-    start = time.time()
-    results = [fn(t) for t in texts]
-    elapsed = time.time() - start
-    return elapsed, results
+def time_and_count(fn, texts, results=None):
+    """
+    Tokenize texts with fn, counting tokens as they are produced. Returns the
+    elapsed time, the vocabulary (set of tokens) and the token frequencies,
+    without holding every token list. Pass a list as `results` to also
+    collect the per-text token lists.
+    """
+    counter = Counter()
+    start = time.perf_counter()
+    for text in texts:
+        tokens = fn(text)
+        counter.update(tokens)
+        if results is not None:
+            results.append(tokens)
+    elapsed = time.perf_counter() - start
+    return elapsed, set(counter), counter
+
+
+def display_freqs(tokenizer, id_freqs):
+    """
+    Token id frequencies keyed by each token's display form for the reports.
+    Tokens that are not valid UTF-8 by themselves show as bytes, so none of
+    them merge under U+FFFD.
+    """
+    display = tokenizer.byte_vocab.display
+    return Counter({display(token_id): count for token_id, count in id_freqs.items()})
+
+
+class TrainingCache:
+    """
+    Trained tokenizers keyed by a hash of (training code version, tokenizer
+    class, settings, corpus).
+
+    Models are kept in an in-memory LRU of `maxsize` entries and, when
+    `cache_dir` is set, also saved there in the binary model format so later
+    runs can load them instead of retraining. The disk cache keeps at most
+    `disk_maxsize` models, dropping the least recently used. Each entry
+    remembers how long the original training took, so train times of models
+    loaded from disk come from the run that trained them.
+    """
+
+    def __init__(self, maxsize=8, cache_dir=None, disk_maxsize=32):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(cls, texts, **params):
+        digest = hashlib.sha256()
+        digest.update(TRAINER_VERSION.encode())
+        digest.update(cls.__name__.encode())
+        digest.update(repr(sorted(params.items())).encode())
+        for text in texts:
+            data = text.encode("utf-8", errors="surrogatepass")
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".bin", base + ".json"
+
+    def _load(self, cls, key):
+        model_path, meta_path = self._paths(key)
+        if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            train_time = json.load(f)["train_time"]
+        os.utime(model_path)
+        return cls.load(model_path), train_time
+
+    def _store(self, key, tokenizer, train_time):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        model_path, meta_path = self._paths(key)
+        tokenizer.save(model_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"train_time": train_time}, f)
+
+        models = sorted(
+            (os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+             if name.endswith(".bin")),
+            key=os.path.getmtime,
+        )
+        for path in models[: max(0, len(models) - self.disk_maxsize)]:
+            os.remove(path)
+            meta = path[: -len(".bin")] + ".json"
+            if os.path.exists(meta):
+                os.remove(meta)
+
+    def put(self, key, entry):
+        """
+        Add a (tokenizer, train time) entry trained elsewhere under `key`.
+        """
+        self._remember(key, entry)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get_or_train(self, cls, texts, **params):
+        """
+        Trained `cls(**params)` for the texts and its original training time
+        in seconds. Cached models are shared, so callers must not retrain them.
+        """
+        texts = list(texts)
+        key = self.key(cls, texts, **params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self.cache_dir is not None:
+            entry = self._load(cls, key)
+        if entry is None:
+            self.misses += 1
+            tokenizer = cls(**params)
+            start = time.perf_counter()
+            tokenizer.train(texts)
+            entry = tokenizer, time.perf_counter() - start
+            if self.cache_dir is not None:
+                self._store(key, *entry)
+        else:
+            self.hits += 1
+        self._remember(key, entry)
+        return entry
+
+
+TRAINING_CACHE = TrainingCache()
+
+
+def train_tokenizer(cls, texts, num_merges=NUM_MERGES):
+    """
+    Trained tokenizer and its training time, reusing TRAINING_CACHE.
+    """
+    tokenizer, train_time = TRAINING_CACHE.get_or_train(cls, texts, num_merges=num_merges)
+    if isinstance(tokenizer, BPETokenizer):
+        # Time tokenization from a cold word cache, as a fresh model would be
+        tokenizer.cache.clear()
+    return tokenizer, train_time
+
+
+# A node argument that is replaced by the result of another node
+Ref = namedtuple("Ref", "name")
+
+
+def _resolve(value, results):
+    if isinstance(value, Ref):
+        return results[value.name]
+    if isinstance(value, (tuple, list)):
+        return type(value)(_resolve(v, results) for v in value)
+    return value
+
+
+def _refs(value):
+    if isinstance(value, Ref):
+        return [value.name]
+    if isinstance(value, (tuple, list)):
+        return [name for v in value for name in _refs(v)]
+    return []
+
+
+def run_dag(nodes, workers=None, initializer=None, initargs=()):
+    """
+    Run a dependency graph of steps and return their results by name.
+
+    `nodes` maps a name to (fn, *args). Any Ref(name) among the args, also
+    inside tuples and lists, is replaced by that node's result, which makes
+    it a dependency. Nodes whose dependencies are done run in parallel on a
+    process pool of `workers` processes; with workers=1 they run in this
+    process, in the order given.
+    """
+    deps = {name: set(_refs(spec[1:])) for name, spec in nodes.items()}
+    for name, needed in deps.items():
+        missing = needed - nodes.keys()
+        if missing:
+            raise ValueError(f"node {name!r} depends on unknown nodes {sorted(missing)}")
+
+    results = {}
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        pending = list(nodes)
+        while pending:
+            ready = [name for name in pending if deps[name] <= results.keys()]
+            if not ready:
+                raise ValueError(f"dependency cycle among {pending}")
+            for name in ready:
+                fn, *args = nodes[name]
+                results[name] = fn(*_resolve(args, results))
+                pending.remove(name)
+        return results
+
+    pending = dict(nodes)
+    running = {}
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=initializer, initargs=initargs
+    ) as pool:
+        while pending or running:
+            for name in [n for n in pending if deps[n] <= results.keys()]:
+                fn, *args = pending.pop(name)
+                running[pool.submit(fn, *_resolve(args, results))] = name
+            if not running:
+                raise ValueError(f"dependency cycle among {list(pending)}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+    return results
+
+
+def _init_analysis_worker(cache_dir):
+    TRAINING_CACHE.cache_dir = cache_dir
+
+
+def train_model(cls, texts):
+    """
+    DAG step: train (or fetch from the cache) a tokenizer for the texts.
+    Returns its cache key and a (tokenizer, train time) entry.
+    """
+    tokenizer, train_time = train_tokenizer(cls, texts)
+    return TrainingCache.key(cls, texts, num_merges=NUM_MERGES), (tokenizer, train_time)
+
+
+def run_report(section, args, models=()):
+    """
+    DAG step: run one analysis section and return the text it wrote.
+    Models trained by other steps are put in the cache first, so the
+    section does not train them again.
+    """
+    for key, entry in models:
+        TRAINING_CACHE.put(key, entry)
+    f = io.StringIO()
+    # Sections echo what they write; the caller prints it in section order
+    with contextlib.redirect_stdout(io.StringIO()):
+        section(f, *args)
+    return f.getvalue()
+
+
+def analysis_nodes():
+    """
+    The steps of the full analysis and the order their reports are written.
+    """
+    sent = Ref("sent")
+    wiki = Ref("wiki")
+    nodes = {
+        "sent": (load_sentiment140,),
+        "wiki": (load_wikipedia,),
+        "sent_clean": (preprocess_batch, sent),
+        "bpe_sent": (train_model, BPETokenizer, sent),
+        "bpe_wiki": (train_model, BPETokenizer, wiki),
+        "bpe_sent_clean": (train_model, BPETokenizer, Ref("sent_clean")),
+        "sp_sent": (train_model, SentencePieceBPE, sent),
+        "sp_wiki": (train_model, SentencePieceBPE, wiki),
+        "report_1_sent": (run_report, run_comparison_1, ("Sentiment140", sent), [Ref("bpe_sent")]),
+        "report_1_wiki": (run_report, run_comparison_1, ("Wikipedia", wiki), [Ref("bpe_wiki")]),
+        "report_2": (run_report, run_comparison_2, (sent,), [Ref("bpe_sent"), Ref("bpe_sent_clean")]),
+        "report_3_sent": (run_report, run_comparison_3, ("Sentiment140", sent),
+                          [Ref("bpe_sent"), Ref("sp_sent")]),
+        "report_3_wiki": (run_report, run_comparison_3, ("Wikipedia", wiki),
+                          [Ref("bpe_wiki"), Ref("sp_wiki")]),
+        "report_4_sent": (run_report, run_vocab_sweep, ("Sentiment140", sent)),
+        "report_4_wiki": (run_report, run_vocab_sweep, ("Wikipedia", wiki)),
+    }
+    order = [
+        "report_1_sent", "report_1_wiki",
+        "report_2",
+        "report_3_sent", "report_3_wiki",
+        "report_4_sent", "report_4_wiki",
+    ]
+    return nodes, order
 
 
 def save_freq_plot(freqs, title, filename, top_n=50):
@@ -93,16 +378,12 @@ def run_comparison_1(f, corpus_name, texts):
     write(f, f"{'#'*60}")
 
     # Space tokenization
-    t_space, space_results = time_tokenization(space_tokenize, texts)
-    space_vocab, space_freqs = get_vocab_and_freqs(space_results)
+    t_space, space_vocab, space_freqs = time_and_count(space_tokenize, texts)
 
     # BPE tokenization
-    bpe = BPETokenizer(num_merges=NUM_MERGES)
-    t_train_start = time.time()
-    bpe.train(texts)
-    t_train = time.time() - t_train_start
-    t_bpe, bpe_results = time_tokenization(bpe.tokenize, texts)
-    bpe_vocab, bpe_freqs = get_vocab_and_freqs(bpe_results)
+    bpe, t_train = train_tokenizer(BPETokenizer, texts)
+    t_bpe, bpe_vocab, bpe_freqs = time_and_count(bpe.encode, texts)
+    bpe_freqs = display_freqs(bpe, bpe_freqs)
 
     tag = corpus_name.lower().replace(" ", "_")
 
@@ -111,12 +392,14 @@ def run_comparison_1(f, corpus_name, texts):
         ["BPE", len(bpe_vocab), f"{t_bpe:.3f}s", f"{t_train:.3f}s"],
     ], ["Method", "Vocab Size", "Tokenize Time", "Train Time"])
 
-    write_token_list(f, f"Space Top 100 — {corpus_name}", space_freqs.most_common(100))
-    write_token_list(f, f"Space Bottom 100 — {corpus_name}", space_freqs.most_common()[-(100):])
-    write_token_list(f, f"BPE Top 100 — {corpus_name}", bpe_freqs.most_common(100))
-    write_token_list(f, f"BPE Bottom 100 — {corpus_name}", bpe_freqs.most_common()[-(100):])
+    space_stats = summarize(space_freqs, 100)
+    bpe_stats = summarize(bpe_freqs, 100)
+    write_token_list(f, f"Space Top 100 — {corpus_name}", space_stats["top"])
+    write_token_list(f, f"Space Bottom 100 — {corpus_name}", space_stats["bottom"])
+    write_token_list(f, f"BPE Top 100 — {corpus_name}", bpe_stats["top"])
+    write_token_list(f, f"BPE Bottom 100 — {corpus_name}", bpe_stats["bottom"])
 
-    longest_bpe = sorted(bpe_vocab, key=len, reverse=True)[:100]
+    longest_bpe = bpe_stats["longest"]
     write(f, f"\n--- BPE Longest 100 Subwords — {corpus_name} ---")
     for i, tok in enumerate(longest_bpe):
         write(f, f"  {i+1:4d}. {repr(tok):40s}  len={len(tok)}")
@@ -133,33 +416,29 @@ def run_comparison_2(f, texts):
     texts_clean = [preprocess_part1(t) for t in texts]
 
     # BPE without regex
-    bpe_raw = BPETokenizer(num_merges=NUM_MERGES)
-    t_train_raw_start = time.time()
-    bpe_raw.train(texts)
-    t_train_raw = time.time() - t_train_raw_start
-    t_raw, raw_results = time_tokenization(bpe_raw.tokenize, texts)
-    raw_vocab, raw_freqs = get_vocab_and_freqs(raw_results)
+    bpe_raw, t_train_raw = train_tokenizer(BPETokenizer, texts)
+    t_raw, raw_vocab, raw_freqs = time_and_count(bpe_raw.encode, texts)
+    raw_freqs = display_freqs(bpe_raw, raw_freqs)
 
     # BPE with regex
-    bpe_clean = BPETokenizer(num_merges=NUM_MERGES)
-    t_train_clean_start = time.time()
-    bpe_clean.train(texts_clean)
-    t_train_clean = time.time() - t_train_clean_start
-    t_clean, clean_results = time_tokenization(bpe_clean.tokenize, texts_clean)
-    clean_vocab, clean_freqs = get_vocab_and_freqs(clean_results)
+    bpe_clean, t_train_clean = train_tokenizer(BPETokenizer, texts_clean)
+    t_clean, clean_vocab, clean_freqs = time_and_count(bpe_clean.encode, texts_clean)
+    clean_freqs = display_freqs(bpe_clean, clean_freqs)
 
     write_table(f, "Summary — Sentiment140", [
         ["BPE (no regex)", len(raw_vocab), f"{t_raw:.3f}s", f"{t_train_raw:.3f}s"],
         ["BPE (with regex)", len(clean_vocab), f"{t_clean:.3f}s", f"{t_train_clean:.3f}s"],
     ], ["Method", "Vocab Size", "Tokenize Time", "Train Time"])
 
-    write_token_list(f, "BPE No-Regex Top 100", raw_freqs.most_common(100))
-    write_token_list(f, "BPE No-Regex Bottom 100", raw_freqs.most_common()[-(100):])
-    write_token_list(f, "BPE With-Regex Top 100", clean_freqs.most_common(100))
-    write_token_list(f, "BPE With-Regex Bottom 100", clean_freqs.most_common()[-(100):])
+    raw_stats = summarize(raw_freqs, 100)
+    clean_stats = summarize(clean_freqs, 100)
+    write_token_list(f, "BPE No-Regex Top 100", raw_stats["top"])
+    write_token_list(f, "BPE No-Regex Bottom 100", raw_stats["bottom"])
+    write_token_list(f, "BPE With-Regex Top 100", clean_stats["top"])
+    write_token_list(f, "BPE With-Regex Bottom 100", clean_stats["bottom"])
 
-    longest_raw = sorted(raw_vocab, key=len, reverse=True)[:100]
-    longest_clean = sorted(clean_vocab, key=len, reverse=True)[:100]
+    longest_raw = raw_stats["longest"]
+    longest_clean = clean_stats["longest"]
     write(f, "\n--- BPE No-Regex Longest 100 Subwords ---")
     for i, tok in enumerate(longest_raw):
         write(f, f"  {i+1:4d}. {repr(tok):40s}  len={len(tok)}")
@@ -177,20 +456,14 @@ def run_comparison_3(f, corpus_name, texts):
     write(f, f"{'#'*60}")
 
     # BPE
-    bpe = BPETokenizer(num_merges=NUM_MERGES)
-    t_train_bpe_start = time.time()
-    bpe.train(texts)
-    t_train_bpe = time.time() - t_train_bpe_start
-    t_bpe, bpe_results = time_tokenization(bpe.tokenize, texts)
-    bpe_vocab, bpe_freqs = get_vocab_and_freqs(bpe_results)
+    bpe, t_train_bpe = train_tokenizer(BPETokenizer, texts)
+    t_bpe, bpe_vocab, bpe_freqs = time_and_count(bpe.encode, texts)
+    bpe_freqs = display_freqs(bpe, bpe_freqs)
 
     # SentencePiece
-    sp = SentencePieceBPE(num_merges=NUM_MERGES)
-    t_train_sp_start = time.time()
-    sp.train(texts)
-    t_train_sp = time.time() - t_train_sp_start
-    t_sp, sp_results = time_tokenization(sp.tokenize, texts)
-    sp_vocab, sp_freqs = get_vocab_and_freqs(sp_results)
+    sp, t_train_sp = train_tokenizer(SentencePieceBPE, texts)
+    t_sp, sp_vocab, sp_freqs = time_and_count(sp.encode, texts)
+    sp_freqs = display_freqs(sp, sp_freqs)
 
     tag = corpus_name.lower().replace(" ", "_")
 
@@ -199,13 +472,15 @@ def run_comparison_3(f, corpus_name, texts):
         ["SentencePiece", len(sp_vocab), f"{t_sp:.3f}s", f"{t_train_sp:.3f}s"],
     ], ["Method", "Vocab Size", "Tokenize Time", "Train Time"])
 
-    write_token_list(f, f"BPE Top 100 — {corpus_name}", bpe_freqs.most_common(100))
-    write_token_list(f, f"BPE Bottom 100 — {corpus_name}", bpe_freqs.most_common()[-(100):])
-    write_token_list(f, f"SentencePiece Top 100 — {corpus_name}", sp_freqs.most_common(100))
-    write_token_list(f, f"SentencePiece Bottom 100 — {corpus_name}", sp_freqs.most_common()[-(100):])
+    bpe_stats = summarize(bpe_freqs, 100)
+    sp_stats = summarize(sp_freqs, 100)
+    write_token_list(f, f"BPE Top 100 — {corpus_name}", bpe_stats["top"])
+    write_token_list(f, f"BPE Bottom 100 — {corpus_name}", bpe_stats["bottom"])
+    write_token_list(f, f"SentencePiece Top 100 — {corpus_name}", sp_stats["top"])
+    write_token_list(f, f"SentencePiece Bottom 100 — {corpus_name}", sp_stats["bottom"])
 
-    longest_bpe = sorted(bpe_vocab, key=len, reverse=True)[:100]
-    longest_sp = sorted(sp_vocab, key=len, reverse=True)[:100]
+    longest_bpe = bpe_stats["longest"]
+    longest_sp = sp_stats["longest"]
     write(f, f"\n--- BPE Longest 100 Subwords — {corpus_name} ---")
     for i, tok in enumerate(longest_bpe):
         write(f, f"  {i+1:4d}. {repr(tok):40s}  len={len(tok)}")
@@ -217,30 +492,60 @@ def run_comparison_3(f, corpus_name, texts):
     save_freq_plot(sp_freqs, f"SentencePiece Top-50 Frequencies — {corpus_name}", f"3_sp_freq_{tag}.png")
 
 
-def main():
+def run_vocab_sweep(f, corpus_name, texts):
+    write(f, f"\n{'#'*60}")
+    write(f, f"# Analysis 4: BPE Vocabulary Size Sweep — {corpus_name}")
+    write(f, f"{'#'*60}")
+
+    # One training run gives the model at every merge count
+    bpe = BPETokenizer()
+    t_start = time.perf_counter()
+    snapshots = bpe.train_sweep(texts, SWEEP_MERGES)
+    t_sweep = time.perf_counter() - t_start
+
+    write_table(f, f"Size Curve — {corpus_name} (trained once in {t_sweep:.3f}s)", [
+        [s["num_merges"], s["vocab_size"], s["tokens"], f"{s['compression_ratio']:.3f}"]
+        for s in snapshots
+    ], ["Merges", "Vocab Size", "Corpus Tokens", "Bytes per Token"])
+
+
+def main(workers=None, cache_dir=None):
+    """
+    Run every analysis. Independent steps run in parallel on `workers`
+    processes (all CPUs by default), but the report is always written in
+    the same section order.
+
+    With more than one worker, "Train Time" and "Tokenize Time" are measured
+    while other steps run at the same time, so they are only comparable
+    within a run; pass workers=1 for timings without that contention.
+
+    With `cache_dir` (e.g. MODEL_CACHE_DIR) trained models are kept on disk
+    and re-runs skip training; their "Train Time" is then the one measured
+    when they were first trained.
+    """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    print("Loading datasets...")
-    sent_texts = load_sentiment140()
-    wiki_texts = load_wikipedia()
-    print(f"  Sentiment140: {len(sent_texts)} texts")
-    print(f"  Wikipedia:    {len(wiki_texts)} texts")
+    nodes, order = analysis_nodes()
+    print("Running analysis steps...")
+    results = run_dag(
+        nodes, workers or os.cpu_count() or 1,
+        initializer=_init_analysis_worker, initargs=(cache_dir,),
+    )
+    print(f"  Sentiment140: {len(results['sent'])} texts")
+    print(f"  Wikipedia:    {len(results['wiki'])} texts")
 
     out_path = os.path.join(OUTPUT_DIR, "analysis_data.txt")
     with open(out_path, "w", encoding="utf-8") as f:
-        # Analysis 1
-        run_comparison_1(f, "Sentiment140", sent_texts)
-        run_comparison_1(f, "Wikipedia", wiki_texts)
-
-        # Analysis 2
-        run_comparison_2(f, sent_texts)
-
-        # Analysis 3
-        run_comparison_3(f, "Sentiment140", sent_texts)
-        run_comparison_3(f, "Wikipedia", wiki_texts)
+        if cache_dir is not None:
+            note = f"Note: train times of models loaded from {cache_dir} are from earlier runs.\n\n"
+            print(note, end="")
+            f.write(note)
+        for name in order:
+            print(results[name], end="")
+            f.write(results[name])
 
     print(f"\nAll outputs saved to {OUTPUT_DIR}/")
 
 
 if __name__ == "__main__":
-    main()
+    main(cache_dir=MODEL_CACHE_DIR if "--model-cache" in sys.argv[1:] else None)